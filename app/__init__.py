@@ -19,16 +19,36 @@ limitations under the License.
 from flask import Flask
 from flask_mail import Mail
 from config import config
+from .assets import Assets
+from .cache import ResultsCache, SingleFlight, WedgeStore
+from .compress import Compress
+from .pipeline import Pipeline
+
+__version__ = '2.0.0'
 
 mail = Mail()
+results_cache = ResultsCache()
+wedge_store = WedgeStore()
+single_flight = SingleFlight()
+results_pipeline = Pipeline(flight=single_flight)
+compress = Compress()
+assets = Assets()
 
 
 def create_app(config_name):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     mail.init_app(app)
+    results_cache.init_app(app)
+    wedge_store.init_app(app)
+    single_flight.init_app(app)
+    results_pipeline.init_app(app)
+    compress.init_app(app)
+    assets.init_app(app)
     
     from .main import main as main_blueprint
+    from .main.permalink import ParamsConverter
+    app.url_map.converters['params'] = ParamsConverter
     app.register_blueprint(main_blueprint)
     
     return app
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import base64
+import collections
+import hashlib
+import mimetypes
+import os
+import threading
+from urllib.request import urlopen
+
+from flask import abort, current_app, request, url_for
+from markupsafe import Markup
+
+# one year, the longest lifetime caches are expected to honour
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+VendorAsset = collections.namedtuple('VendorAsset', ['path', 'cdn', 'integrity'])
+Asset = collections.namedtuple('Asset', ['name', 'filename', 'integrity', 'data'])
+
+# third party libraries, vendored under the static folder by `flask vendor-assets`. The integrity of each file is
+# the sha384 subresource integrity hash published for its CDN copy
+VENDOR = collections.OrderedDict([
+    ('jquery', VendorAsset(
+        'vendor/jquery-3.5.1.slim.min.js', 'https://code.jquery.com/jquery-3.5.1.slim.min.js',
+        'sha384-DfXdz2htPH0lsSSs5nCTpuj/zy4C+OGpamoFVy38MVBnE+IbbVYUew+OrCXaRkfj'
+    )),
+    ('popper', VendorAsset(
+        'vendor/popper-1.16.1.min.js', 'https://cdn.jsdelivr.net/npm/popper.js@1.16.1/dist/umd/popper.min.js',
+        'sha384-9/reFTGAW83EW2RDu2S0VKaIzap3H66lZH81PoYlFhbGU+6BZp6G7niu735Sk7lN'
+    )),
+    ('bootstrap', VendorAsset(
+        'vendor/bootstrap-4.5.2.min.js', 'https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/js/bootstrap.min.js',
+        'sha384-B4gt1jrGC7Jh4AgTPSdUtOBvfO8shuf57BaghqFfPlYxofvL8/KUEfYiJOMMV+rV'
+    )),
+    ('bootstrap_css', VendorAsset(
+        'vendor/bootstrap-4.5.2.min.css', 'https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css',
+        'sha384-JcKb8q3iqJ61gNV9KGb8thSsNjpSL0n8PARn9HuZOnIxN0hoP+VmmDGMN5t9UJ0Z'
+    )),
+])
+MODES = ['local', 'cdn', 'inline']
+
+
+def integrity(data):
+    """Returns the sha384 subresource integrity hash of data"""
+    return 'sha384-' + base64.b64encode(hashlib.sha384(data).digest()).decode('ascii')
+
+
+class Assets(object):
+    """Serves BokehJS and the vendored javascript and css libraries
+
+    BokehJS is read from the resources of the installed bokeh package, so the browser always runs the version the
+    plots were serialized with. ASSETS_MODE selects how templates load each library:
+
+    - local: from this app, at a URL holding a hash of the content, sent with Cache-Control: immutable and
+      compressed once per process. The vendored libraries are checked for once, when the app is created, and an
+      error is logged for those not fetched yet with `flask vendor-assets`. Rendering a page that needs one of
+      them raises FileNotFoundError, rather than quietly depending on a CDN. The check cannot stop the app from
+      starting, since `flask vendor-assets` itself creates the app
+    - cdn: from the public CDNs, BokehJS at the release matching the installed package
+    - inline: embedded in the page
+
+    Every script and stylesheet tag carries a subresource integrity hash. Templates get the extension as `assets`
+    and call assets.script(name) and assets.stylesheet(name), with name one of 'bokeh' or the keys of VENDOR.
+
+    Follows the flask extension pattern: init_app reads ASSETS_MODE from the app config and adds the /assets route.
+
+    """
+
+    def __init__(self, app=None):
+        self.mode = 'cdn'
+        self._assets = {}
+        # names of the vendored libraries missing from the static folder, None until checked
+        self._missing = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.mode = app.config.get('ASSETS_MODE', self.mode)
+        if self.mode not in MODES:
+            raise ValueError("ASSETS_MODE must be one of {}".format(', '.join(MODES)))
+        self.clear()
+        if self.mode != 'cdn':
+            self._missing = self._check(app.static_folder)
+            if self._missing:
+                app.logger.error("%s not vendored, pages will fail until `flask vendor-assets` fetches them or "
+                                 "ASSETS_MODE is set to cdn", ', '.join(sorted(self._missing)))
+        app.add_url_rule('/assets/<filename>', 'assets', self.send)
+        app.context_processor(lambda: {'assets': self})
+        app.extensions['assets'] = self
+
+    @staticmethod
+    def _check(static_folder):
+        """Returns the set of names of the vendored libraries missing from static_folder"""
+        return {name for name, asset in VENDOR.items() if not os.path.isfile(os.path.join(static_folder, asset.path))}
+
+    def _path(self, name):
+        if name == 'bokeh':
+            # bokeh is imported when BokehJS is first needed rather than when the app is created
+            from bokeh.util.paths import bokehjsdir
+            return os.path.join(bokehjsdir(), 'js', 'bokeh.min.js')
+        return os.path.join(current_app.static_folder, VENDOR[name].path)
+
+    def _asset(self, name):
+        """Returns the content and fingerprinted file name of a library, or None when it is not vendored"""
+        with self._lock:
+            asset = self._assets.get(name)
+        if asset is None:
+            path = self._path(name)
+            if not os.path.isfile(path):
+                return None
+            with open(path, 'rb') as f:
+                data = f.read()
+            root, ext = os.path.splitext(os.path.basename(path))
+            if name == 'bokeh':
+                import bokeh
+                root = 'bokeh-{}.min'.format(bokeh.__version__)
+            filename = '{}.{}{}'.format(root, hashlib.sha256(data).hexdigest()[:16], ext)
+            asset = Asset(name, filename, integrity(data), data)
+            with self._lock:
+                self._assets[name] = asset
+        return asset
+
+    def _cdn(self, name):
+        """Returns the CDN URL and integrity hash of a library"""
+        if name == 'bokeh':
+            from bokeh.resources import Resources
+            resources = Resources(mode='cdn', components=['bokeh'])
+            url = resources.js_files[0]
+            try:
+                return url, 'sha384-' + resources.hashes[url]
+            except (KeyError, ValueError):  # development builds of bokeh have no published hashes
+                return url, None
+        return VENDOR[name].cdn, VENDOR[name].integrity
+
+    def _source(self, name):
+        """Returns (url, integrity, data) of a library for the current mode. data is set in inline mode only"""
+        if self.mode != 'cdn':
+            if self._missing is None:
+                self._missing = self._check(current_app.static_folder)
+            asset = None if name in self._missing else self._asset(name)
+            if asset is None:
+                raise FileNotFoundError("{} is not vendored at {}, run `flask vendor-assets` or set ASSETS_MODE=cdn"
+                                        .format(name, self._path(name)))
+            if self.mode == 'inline':
+                return None, None, asset.data
+            return url_for('assets', filename=asset.filename), asset.integrity, None
+        url, sri = self._cdn(name)
+        return url, sri, None
+
+    @staticmethod
+    def _attributes(sri):
+        return Markup(' integrity="{}" crossorigin="anonymous"'.format(sri)) if sri else ''
+
+    def script(self, name):
+        """Returns the script tag loading the javascript library name"""
+        url, sri, data = self._source(name)
+        if data is not None:
+            return Markup('<script type="text/javascript">{}</script>').format(Markup(data.decode('utf-8')))
+        return Markup('<script type="text/javascript" src="{}"{}></script>').format(url, self._attributes(sri))
+
+    def stylesheet(self, name):
+        """Returns the tag loading the stylesheet name"""
+        url, sri, data = self._source(name)
+        if data is not None:
+            return Markup('<style>{}</style>').format(Markup(data.decode('utf-8')))
+        return Markup('<link rel="stylesheet" type="text/css" href="{}"{}>').format(url, self._attributes(sri))
+
+    def send(self, filename):
+        """View sending a library by its fingerprinted file name, cacheable for good"""
+        for name in ['bokeh'] + list(VENDOR):
+            asset = self._asset(name)
+            if asset is not None and asset.filename == filename:
+                break
+        else:
+            abort(404)
+        # BokehJS is about 1 MB, so it is compressed once rather than by Compress.after_request on every request
+        compress = current_app.extensions.get('compress')
+        data, encoding = asset.data, None
+        if compress is not None:
+            data, encoding = compress.encode(asset.filename, asset.data, self._path(name))
+        response = current_app.response_class(data, mimetype=mimetypes.guess_type(filename)[0])
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+            response.set_etag('{}.{}'.format(asset.filename, encoding))
+        else:
+            response.set_etag(asset.filename)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        return response.make_conditional(request)
+
+    def vendor(self, app):
+        """Downloads every vendored library from its CDN into the static folder, checking its integrity hash
+
+        Returns
+        -------
+        list
+            paths of the files written
+
+        Raises
+        ------
+        ValueError
+            when a download does not match the published integrity hash
+
+        """
+        written = []
+        for name, asset in VENDOR.items():
+            path = os.path.join(app.static_folder, asset.path)
+            with urlopen(asset.cdn) as response:
+                data = response.read()
+            if integrity(data) != asset.integrity:
+                raise ValueError("{} does not match its integrity hash {}".format(asset.cdn, asset.integrity))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+            written.append(path)
+        self.clear()
+        return written
+
+    def clear(self):
+        """Forgets the libraries read so far, so that files vendored since are picked up"""
+        with self._lock:
+            self._assets.clear()
+            self._missing = None
@@ -0,0 +1,479 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - fcntl is not available on windows
+    fcntl = None
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize', 'ttl'])
+StoreInfo = collections.namedtuple('StoreInfo', ['hits', 'misses', 'entries', 'nbytes', 'max_bytes'])
+FlightInfo = collections.namedtuple('FlightInfo', ['calls', 'executions', 'coalesced', 'waited'])
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(params):
+    """Returns a canonical hash of a dictionary of scenario parameters
+
+    The parameters are serialized as JSON with sorted keys and no whitespace, so the same values always give the
+    same key regardless of insertion order.
+
+    Parameters
+    ----------
+    params : dict
+        JSON serializable scenario parameters
+
+    Returns
+    -------
+    str
+        hex digest of the sha256 hash of the parameters
+
+    """
+    canonical = json.dumps(params, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResultsCache(object):
+    """Bounded, thread-safe in-process cache with a least recently used eviction policy and a time to live
+
+    Follows the flask extension pattern: create it once and bind it to an app with init_app, which reads
+    RESULTS_CACHE_SIZE (the maximum number of entries, 0 disables the cache) and RESULTS_CACHE_TTL (seconds an
+    entry stays valid) from the app config.
+
+    """
+
+    def __init__(self, app=None, maxsize=128, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('RESULTS_CACHE_SIZE', self.maxsize)
+        self.ttl = app.config.get('RESULTS_CACHE_TTL', self.ttl)
+        self.clear()
+        app.extensions['results_cache'] = self
+
+    def get(self, key):
+        """Returns the value stored under key, or None when it is missing or has expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def peek(self, key):
+        """Returns the value stored under key, or None, without counting a lookup or refreshing its position"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            return entry[1]
+
+    def set(self, key, value):
+        """Stores value under key, evicting the least recently used entries beyond maxsize"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Removes every entry and resets the statistics"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """Returns hit, miss and size statistics
+
+        Returns
+        -------
+        CacheInfo
+
+        """
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries), self.ttl)
+
+    @property
+    def hit_rate(self):
+        """fraction of lookups that were hits"""
+        info = self.info()
+        lookups = info.hits + info.misses
+        return info.hits / lookups if lookups else 0.
+
+
+class WedgeStore(object):
+    """Persistent, content-addressed store of computed wedge arrays shared by every worker process
+
+    Each scenario is identified by the fingerprint of a dictionary of its parameters and owns a directory holding
+    one .npy file per array. Arrays are loaded with memory mapping, so workers reading the same scenario share the
+    page cache. Every file is written to a temporary name and moved into place with os.replace, so readers never
+    see a partial file. When the store grows beyond max_bytes the least recently used scenarios are deleted until
+    it is back under EVICT_TO of max_bytes. The store is only scanned on the first save and when the bytes
+    written since the last scan take it over max_bytes, so a save does not cost a walk of the whole store. Writes
+    of other processes are picked up at the next scan.
+
+    Follows the flask extension pattern: init_app reads WEDGE_CACHE_DIR (the store directory, unset disables the
+    store) and WEDGE_CACHE_MAX_BYTES from the app config.
+
+    """
+
+    # fraction of max_bytes left after an eviction, the headroom saves fill before the store is scanned again
+    EVICT_TO = 0.9
+
+    def __init__(self, directory=None, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # size of the store at the last scan plus the bytes saved since, None until the first scan
+        self._nbytes = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.directory = app.config.get('WEDGE_CACHE_DIR', self.directory)
+        self.max_bytes = app.config.get('WEDGE_CACHE_MAX_BYTES', self.max_bytes)
+        self._nbytes = None
+        app.extensions['wedge_store'] = self
+
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    def _entry(self, params):
+        key = fingerprint(params)
+        return os.path.join(self.directory, key[:2], key)
+
+    def load(self, params, name):
+        """Returns the read-only memory mapped array stored under name for a scenario, or None
+
+        Parameters
+        ----------
+        params : dict
+            JSON serializable parameters identifying the scenario
+        name : str
+            name of the array
+
+        Returns
+        -------
+        numpy.memmap
+
+        """
+        if not self.enabled:
+            return None
+        import numpy as np  # only scenarios with an enabled store pay for numpy here
+        entry = self._entry(params)
+        try:
+            array = np.load(os.path.join(entry, name + '.npy'), mmap_mode='r')
+            os.utime(entry)  # mark the scenario as recently used
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return array
+
+    def save(self, params, name, array):
+        """Atomically stores array under name for a scenario and evicts old scenarios beyond max_bytes
+
+        Parameters
+        ----------
+        params : dict
+            JSON serializable parameters identifying the scenario
+        name : str
+            name of the array
+        array : array_like
+            array to store
+
+        """
+        if not self.enabled:
+            return
+        import numpy as np
+        entry = self._entry(params)
+        try:
+            os.makedirs(entry, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=entry, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.asarray(array))
+                nbytes = f.tell()
+            os.replace(tmp, os.path.join(entry, name + '.npy'))
+        except OSError:
+            # the scenario was evicted by another worker while it was being written, so it is just not stored
+            return
+        with self._lock:
+            if self._nbytes is not None and self._nbytes + nbytes <= self.max_bytes:
+                self._nbytes += nbytes
+                return
+            self._evict()
+
+    def _entries(self):
+        """Returns (mtime, nbytes, path) of every scenario in the store"""
+        entries = []
+        for prefix in os.scandir(self.directory):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                try:
+                    nbytes = sum(f.stat().st_size for f in os.scandir(entry.path))
+                    entries.append((entry.stat().st_mtime, nbytes, entry.path))
+                except OSError:
+                    continue
+        return entries
+
+    def _evict(self):
+        """Scans the store, deletes the least recently used scenarios when it is over max_bytes and resets the
+        running size"""
+        entries = self._entries()
+        total = sum(e[1] for e in entries)
+        if total > self.max_bytes:
+            for _, nbytes, path in sorted(entries):
+                if total <= self.EVICT_TO * self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= nbytes
+        self._nbytes = total
+
+    def info(self):
+        """Returns hit, miss and size statistics
+
+        Returns
+        -------
+        StoreInfo
+
+        """
+        entries = self._entries() if self.enabled and os.path.isdir(self.directory) else []
+        return StoreInfo(self.hits, self.misses, len(entries), sum(e[1] for e in entries), self.max_bytes)
+
+
+class _Call(object):
+    """A computation in flight, which the callers that join it wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# no result was handed over through a lock file
+_MISSING = object()
+# first byte of a lock file, set by a process that waits on the lock, and the prefix of a handed over result
+_WAITING = b'w'
+_RESULT = b'r'
+
+
+class SingleFlight(object):
+    """Coalesces identical concurrent computations so that each one runs once
+
+    The first caller for a key runs the computation and every caller that arrives with the same key while it is
+    in flight waits for it and shares its result.
+
+    When a lock directory is configured the computation also holds an exclusive lock on <lock_dir>/<key>.lock, so
+    identical computations in other processes wait for it instead of running side by side. A process that has to
+    wait marks the lock file, and the process holding the lock then pickles its result into the file before it
+    deletes the file and unlocks it. The waiters read the result from the file they still have open, so lock
+    files only exist while a computation is running and the results they carry go away with the last waiter.
+    A result that cannot be pickled, or a failed computation, is not handed over, and the waiters queue on a new
+    lock file to compute it themselves, one at a time. Only this app should be able to write to the directory,
+    since the results are unpickled.
+
+    Follows the flask extension pattern: init_app reads SINGLE_FLIGHT_LOCK_DIR (unset keeps coalescing within the
+    process) from the app config.
+
+    """
+
+    def __init__(self, lock_dir=None):
+        self.lock_dir = lock_dir
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.waited = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.lock_dir = app.config.get('SINGLE_FLIGHT_LOCK_DIR', self.lock_dir)
+        app.extensions['single_flight'] = self
+
+    def do(self, key, fn, lookup=None):
+        """Returns fn(), running it only once for all concurrent callers with the same key
+
+        Parameters
+        ----------
+        key : str
+            fingerprint of the computation
+        fn : callable
+            the computation
+        lookup : callable
+            returns an already computed result or None. It is checked before fn runs, so a result finished just
+            before this call is not computed again
+
+        Returns
+        -------
+        result
+            the result of fn
+        shared : bool
+            True when the result was computed by another caller
+
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.event.wait()
+            with self._lock:
+                self.coalesced += 1
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        fd = None
+        try:
+            fd, result = self._acquire(key)
+            if result is _MISSING and lookup is not None:
+                result = lookup()
+                if result is None:
+                    result = _MISSING
+            shared = result is not _MISSING
+            if shared:
+                with self._lock:
+                    self.coalesced += 1
+            else:
+                result = fn()
+                with self._lock:
+                    self.executions += 1
+            call.result = result
+            return result, shared
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            if fd is not None:
+                self._release(key, fd, call.result if call.error is None else _MISSING)
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def _lock_path(self, key):
+        return os.path.join(self.lock_dir, key + '.lock')
+
+    def _acquire(self, key):
+        """Locks the lock file of key, unless the process that held it before handed over its result
+
+        Returns
+        -------
+        fd : int
+            descriptor of the locked file, None when no lock directory is configured or a result was handed over
+        result
+            the handed over result, or _MISSING
+
+        """
+        if self.lock_dir is None or fcntl is None:
+            return None, _MISSING
+        os.makedirs(self.lock_dir, exist_ok=True)
+        path = self._lock_path(key)
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # another process is computing the same key, ask for its result and wait for it to finish
+                    with self._lock:
+                        self.waited += 1
+                    os.pwrite(fd, _WAITING, 0)
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                result = _handed_over(fd)
+                if result is not _MISSING:
+                    os.close(fd)
+                    return None, result
+                if os.path.samestat(os.fstat(fd), os.stat(path)):
+                    return fd, _MISSING
+            except FileNotFoundError:
+                pass
+            except BaseException:
+                os.close(fd)
+                raise
+            # the previous holder removed the file without a result, so queue on the file of the next holder
+            os.close(fd)
+
+    def _release(self, key, fd, result):
+        """Hands result over to the processes waiting on the lock file, removes the file and unlocks it"""
+        try:
+            if result is not _MISSING and os.fstat(fd).st_size:
+                try:
+                    os.pwrite(fd, _RESULT + pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), 1)
+                except Exception:
+                    # the waiters compute the result themselves, one at a time
+                    logger.exception("Could not hand the result of %s over to the processes waiting for it", key)
+            # removed while still locked, so later callers lock a new file instead of reading this result
+            os.unlink(self._lock_path(key))
+        except OSError:
+            pass
+        finally:
+            os.close(fd)  # closing the descriptor releases the lock
+
+    def info(self):
+        """Returns call statistics. calls - executions is the number of computations saved
+
+        Returns
+        -------
+        FlightInfo
+
+        """
+        with self._lock:
+            return FlightInfo(self.calls, self.executions, self.coalesced, self.waited)
+
+
+def _handed_over(fd):
+    """Returns the result handed over through a lock file, or _MISSING"""
+    size = os.fstat(fd).st_size
+    data = os.pread(fd, size - 1, 1) if size > 1 else b''
+    if not data.startswith(_RESULT):
+        return _MISSING
+    try:
+        return pickle.loads(data[len(_RESULT):])
+    except Exception:
+        return _MISSING
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+import gzip
+import mimetypes
+import os
+import tempfile
+import threading
+
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, responses are then only gzip compressed
+    brotli = None
+
+CompressInfo = collections.namedtuple('CompressInfo', ['responses', 'original_bytes', 'compressed_bytes', 'saved'])
+
+# file name suffix of the precompressed sibling of a static file, by content coding
+SUFFIXES = collections.OrderedDict([('br', '.br'), ('gzip', '.gz')])
+
+
+class Compress(object):
+    """Compresses responses with brotli or gzip, as negotiated with the Accept-Encoding request header
+
+    Dynamic responses are compressed when their mimetype is in COMPRESS_MIMETYPES and they are at least
+    COMPRESS_MIN_SIZE bytes. Static files are served from precompressed .br and .gz siblings written next to them,
+    either once at startup when COMPRESS_STATIC is set or ahead of time with precompress_static (the
+    `flask compress-static` command). A sibling older than its file is ignored. Views sending a few large,
+    unchanging bodies, such as the fingerprinted assets, compress them once with encode. Compressing a response with a
+    strong ETag makes the ETag weak, since the compressed bytes differ from the ones it was computed for.
+
+    Follows the flask extension pattern: init_app reads COMPRESS_ENABLED, COMPRESS_MIMETYPES, COMPRESS_MIN_SIZE,
+    COMPRESS_LEVEL, COMPRESS_BR_LEVEL and COMPRESS_STATIC from the app config.
+
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.mimetypes = ['text/html', 'text/css', 'text/plain', 'application/json', 'application/javascript',
+                          'text/javascript', 'image/svg+xml']
+        self.min_size = 500
+        self.level = 6
+        self.br_level = 5
+        self._stats = {}
+        self._encoded = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('COMPRESS_ENABLED', self.enabled)
+        self.mimetypes = app.config.get('COMPRESS_MIMETYPES', self.mimetypes)
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', self.min_size)
+        self.level = app.config.get('COMPRESS_LEVEL', self.level)
+        self.br_level = app.config.get('COMPRESS_BR_LEVEL', self.br_level)
+        self.clear()
+        if self.enabled:
+            app.after_request(self.after_request)
+            if app.has_static_folder:
+                app.view_functions['static'] = self._static_view(app, app.view_functions['static'])
+                if app.config.get('COMPRESS_STATIC', False):
+                    self.precompress_static(app)
+        app.extensions['compress'] = self
+
+    @property
+    def encodings(self):
+        """content codings this server can produce, most preferred first"""
+        return [encoding for encoding in SUFFIXES if encoding != 'br' or brotli is not None]
+
+    def _negotiate(self):
+        # the client's quality values decide, ties go to the first server preference
+        encoding = request.accept_encodings.best_match(self.encodings)
+        return encoding if encoding in self.encodings else None
+
+    def compress(self, data, encoding):
+        """Returns data compressed with the content coding encoding, 'br' or 'gzip'"""
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.br_level)
+        return gzip.compress(data, compresslevel=self.level)
+
+    def after_request(self, response):
+        """Compresses a dynamic response in place when the client accepts it and it is worth it"""
+        response.vary.add('Accept-Encoding')
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers or response.mimetype not in self.mimetypes):
+            return response
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+        encoding = self._negotiate()
+        if encoding is None:
+            return response
+        compressed = self.compress(data, encoding)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+        self._record(request.endpoint, len(data), len(compressed))
+        return response
+
+    def encode(self, key, data, path=None):
+        """Returns the body to send for data in the content coding negotiated with the current request
+
+        The compressed body is kept in memory under key and encoding, so key has to change whenever data does, e.g.
+        a file name holding a hash of the content. When path is given, its up to date precompressed sibling is read
+        instead of compressing data.
+
+        Parameters
+        ----------
+        key : str
+            identifies data
+        data : bytes
+            uncompressed body
+        path : str
+            file data was read from
+
+        Returns
+        -------
+        body : bytes
+            data, or data compressed
+        encoding : str
+            content coding of body, None when data is sent as it is
+
+        """
+        encoding = self._negotiate() if self.enabled else None
+        if encoding is None or len(data) < self.min_size:
+            return data, None
+        with self._lock:
+            body = self._encoded.get((key, encoding))
+        if body is None:
+            sibling = path + SUFFIXES[encoding] if path is not None else None
+            if sibling is not None and os.path.isfile(sibling) and os.path.getmtime(sibling) >= os.path.getmtime(path):
+                with open(sibling, 'rb') as f:
+                    body = f.read()
+            else:
+                body = self.compress(data, encoding)
+            with self._lock:
+                self._encoded[(key, encoding)] = body
+        if len(body) >= len(data):
+            return data, None
+        self._record(request.endpoint, len(data), len(body))
+        return body, encoding
+
+    def _static_view(self, app, view):
+        """Wraps the static view so that a precompressed sibling is sent when the client accepts its coding"""
+        def static(filename):
+            encoding = self._negotiate()
+            path = safe_join(app.static_folder, filename)
+            if encoding is not None and path is not None and os.path.isfile(path):
+                sibling = path + SUFFIXES[encoding]
+                if os.path.isfile(sibling) and os.path.getmtime(sibling) >= os.path.getmtime(path):
+                    response = send_from_directory(app.static_folder, filename + SUFFIXES[encoding],
+                                                   mimetype=mimetypes.guess_type(filename)[0])
+                    response.headers['Content-Encoding'] = encoding
+                    response.vary.add('Accept-Encoding')
+                    if response.status_code == 200:
+                        self._record(request.endpoint, os.path.getsize(path), os.path.getsize(sibling))
+                    return response
+            return view(filename=filename)
+        return static
+
+    def precompress_static(self, app):
+        """Writes .br and .gz siblings of every compressible static file that has no up to date sibling
+
+        Files below COMPRESS_MIN_SIZE or whose compressed version is not smaller are skipped, as are images
+        other than SVG, which are already compressed.
+
+        Returns
+        -------
+        list
+            (path, encoding, original bytes, compressed bytes) of every sibling written
+
+        """
+        written = []
+        for root, dirs, files in os.walk(app.static_folder):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                if name.endswith(tuple(SUFFIXES.values())) or mimetypes.guess_type(name)[0] not in self.mimetypes:
+                    continue
+                size = os.path.getsize(path)
+                if size < self.min_size:
+                    continue
+                data = None
+                for encoding in self.encodings:
+                    sibling = path + SUFFIXES[encoding]
+                    if os.path.isfile(sibling) and os.path.getmtime(sibling) >= os.path.getmtime(path):
+                        continue
+                    if data is None:
+                        with open(path, 'rb') as f:
+                            data = f.read()
+                    compressed = self.compress(data, encoding)
+                    if len(compressed) >= size:
+                        continue
+                    # written to a temporary name and moved into place, so workers compressing at the same time
+                    # never serve a partly written sibling
+                    fd, tmp = tempfile.mkstemp(dir=root, suffix='.tmp')
+                    try:
+                        with os.fdopen(fd, 'wb') as f:
+                            f.write(compressed)
+                        os.replace(tmp, sibling)
+                    except OSError:
+                        os.remove(tmp)
+                        raise
+                    written.append((path, encoding, size, len(compressed)))
+        return written
+
+    def _record(self, endpoint, original, compressed):
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, [0, 0, 0])
+            stats[0] += 1
+            stats[1] += original
+            stats[2] += compressed
+
+    def clear(self):
+        """Resets the statistics"""
+        with self._lock:
+            self._stats.clear()
+
+    def info(self):
+        """Returns the compression statistics of each endpoint, e.g. main.permalink or static
+
+        Returns
+        -------
+        dict
+            CompressInfo of each endpoint that sent a compressed response, by endpoint. saved is the number of
+            bytes that were not sent
+
+        """
+        with self._lock:
+            return {endpoint: CompressInfo(count, original, compressed, original - compressed)
+                    for endpoint, (count, original, compressed) in self._stats.items()}
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+import os
+import subprocess
+import sys
+
+ImportTime = collections.namedtuple('ImportTime', ['module', 'self_us', 'cumulative_us'])
+
+# packages that only plotting and computing a scenario need, which creating the app must not import
+DEFERRED_PACKAGES = ['bokeh', 'numpy']
+
+
+def parse_import_time(text):
+    """Parses the report written to stderr by python -X importtime
+
+    Parameters
+    ----------
+    text : str
+        stderr of the interpreter, lines like "import time:       267 |      39107 | app.main"
+
+    Returns
+    -------
+    list
+        ImportTime of every imported module, in import order, times in microseconds
+
+    """
+    times = []
+    for line in text.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = [field.strip() for field in line[len('import time:'):].split('|')]
+        if len(fields) != 3 or not fields[0].isdigit():
+            continue  # the column header
+        times.append(ImportTime(fields[2], int(fields[0]), int(fields[1])))
+    return times
+
+
+def measure_import_time(config_name='default'):
+    """Imports the app and runs create_app in a fresh interpreter under python -X importtime
+
+    Parameters
+    ----------
+    config_name : str
+        key of config.config passed to create_app
+
+    Returns
+    -------
+    list
+        ImportTime of every module imported, as returned by parse_import_time
+
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = 'from app import create_app; create_app({!r})'.format(config_name)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=root, check=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    return parse_import_time(result.stderr)
+
+
+def by_package(times):
+    """Sums the own import time of the modules of each top level package
+
+    Parameters
+    ----------
+    times : list
+        ImportTime of every module
+
+    Returns
+    -------
+    list
+        (package, microseconds) pairs, slowest first
+
+    """
+    totals = collections.Counter()
+    for time in times:
+        totals[time.module.split('.')[0]] += time.self_us
+    return totals.most_common()
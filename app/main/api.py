@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import base64
+import collections
+import io
+
+from flask import jsonify, request, url_for, current_app, make_response
+from . import main
+from .. import results_pipeline, wedge_store
+from . permalink import FIELDS, FieldError, encode_params, parse_fields, validation_errors
+
+# arrays a client may ask for with ?arrays=, for a single scenario and for a batch
+ARRAYS = ['synth', 'amp', 'z', 'z_apparent', 'wavelet', 'spectrum', 'freqs']
+BATCH_ARRAYS = ['amp', 'z', 'z_apparent']
+# ?format= values and the Accept types that select them when no format is given
+FORMATS = collections.OrderedDict([('json', 'application/json'), ('npz', 'application/octet-stream'),
+                                   ('npy', None)])
+
+
+class APIError(Exception):
+    """Invalid API request, answered with a JSON error message and a 400 status"""
+
+    def __init__(self, message, errors=None):
+        super(APIError, self).__init__(message)
+        self.message = message
+        self.errors = errors
+
+
+@main.errorhandler(APIError)
+def api_error(e):
+    body = {'error': e.message}
+    if e.errors:
+        body['errors'] = e.errors
+    return jsonify(body), 400
+
+
+def _requested_arrays(allowed):
+    """Names of the arrays listed in the arrays query argument"""
+    names = [name for name in request.args.get('arrays', '').split(',') if name]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise APIError("Unknown arrays {}, expected some of {}".format(', '.join(unknown), ', '.join(allowed)))
+    return names
+
+
+def _requested_format():
+    """Response format from the format query argument, or negotiated from the Accept header"""
+    fmt = request.args.get('format')
+    if fmt is None:
+        best = request.accept_mimetypes.best_match([mimetype for mimetype in FORMATS.values() if mimetype])
+        return 'npz' if best == FORMATS['npz'] else 'json'
+    if fmt not in FORMATS:
+        raise APIError("Unknown format {}, expected one of {}".format(fmt, ', '.join(FORMATS)))
+    return fmt
+
+
+def _scenario(fields):
+    """Parses and validates the fields of one scenario into normalized inputs"""
+    try:
+        params = parse_fields({key: _field_text(value) for key, value in fields.items()})
+    except FieldError as e:
+        raise APIError("Invalid scenario", {e.field: [e.message]})
+    except (ValueError, AttributeError):
+        raise APIError("Expected the fields {}".format(', '.join(FIELDS)))
+    errors = validation_errors(params)
+    if errors:
+        raise APIError("Invalid scenario", errors)
+    return params
+
+
+def _field_text(value):
+    # batch scenarios are JSON, so numbers and frequency lists are accepted as well as text
+    if isinstance(value, list):
+        return ','.join(str(item) for item in value)
+    return str(value)
+
+
+def _measurements(params, f_central, tuning, onset):
+    """Measured and theoretical tuning parameters of one scenario, in milliseconds"""
+    from . import wedgebuilder as wb
+    return {
+        'permalink': url_for('.permalink', params=encode_params(params)),
+        'f_central': float(f_central),
+        'tuning_thickness': float(tuning),
+        'onset_thickness': float(onset),
+        'tuning_thickness_theoretical': float(wb.get_theoretical_tuning_thickness(f_central)),
+        'onset_thickness_theoretical': float(wb.get_theoretical_onset_tuning_thickness(f_central)),
+        'resolution_limit': float(wb.get_theoretical_resolution_limit(f_central)),
+    }
+
+
+def _npy(array):
+    """Base64 text of the .npy serialization of an array"""
+    import numpy as np
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(array), allow_pickle=False)
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def _respond(fmt, body, arrays):
+    """Serializes the measurements and arrays in the requested format
+
+    Parameters
+    ----------
+    fmt : str
+        json (arrays as nested lists), npy (arrays as base64 .npy text) or npz (an uncompressed .npz file holding
+        the arrays and every number of the body as a 0-d array)
+    body : dict
+        JSON serializable measurements
+    arrays : dict
+        ndarrays by name
+
+    Returns
+    -------
+    flask.Response
+
+    """
+    import numpy as np
+    if fmt == 'npz':
+        buffer = io.BytesIO()
+        scalars = {key: np.asarray(value) for key, value in body.items() if not isinstance(value, str)}
+        np.savez(buffer, **scalars, **arrays)
+        response = make_response(buffer.getvalue())
+        response.mimetype = FORMATS['npz']
+        response.headers['Content-Disposition'] = 'attachment; filename=wedge.npz'
+        return response
+    return jsonify(dict(body, arrays=_encode_arrays(fmt, arrays)))
+
+
+def _encode_arrays(fmt, arrays):
+    """Arrays as base64 .npy text (npy) or nested lists (json)"""
+    import numpy as np
+    encode = _npy if fmt == 'npy' else np.ndarray.tolist
+    return {name: encode(np.asarray(array)) for name, array in arrays.items()}
+
+
+@main.route('/api/v1/wedge')
+def api_wedge():
+    # same inputs as a permalink, as query arguments, e.g.
+    # /api/v1/wedge?vp_1=3000&rho_1=2.5&vp_2=2700&rho_2=2.3&vp_units=0&wv_type=0&freq=25&wv_len=0.2&wv_dt=0.001
+    names = _requested_arrays(ARRAYS)
+    fmt = _requested_format()
+    params = _scenario({key: value for key, value in request.args.items() if key not in ['arrays', 'format']})
+    # the stages are shared with the results page, so neither recomputes what the other already has
+    stages = results_pipeline.run(params, ['wavelet', 'analysis'])
+    entry = stages['wavelet']
+    analysis = stages['analysis']
+    body = _measurements(params, entry.f_central, analysis.tuning_thickness, analysis.onset_thickness)
+    available = {'synth': lambda: analysis.synth, 'amp': lambda: analysis.amp, 'z': lambda: analysis.z,
+                 'z_apparent': lambda: analysis.z_apparent, 'wavelet': lambda: entry.w,
+                 'spectrum': lambda: entry.spectrum, 'freqs': lambda: entry.freqs}
+    return _respond(fmt, body, {name: available[name]() for name in names})
+
+
+@main.route('/api/v1/wedge/batch', methods=['POST'])
+def api_wedge_batch():
+    # a JSON body {"scenarios": [{...}, ...]} holding the fields of each scenario, numbers and lists allowed
+    import numpy as np
+    from . import wedgebuilder as wb
+    names = _requested_arrays(BATCH_ARRAYS)
+    fmt = _requested_format()
+    body = request.get_json(silent=True)
+    scenarios = body.get('scenarios') if isinstance(body, dict) else None
+    if not isinstance(scenarios, list) or not scenarios:
+        raise APIError("Expected a JSON body with a non-empty list of scenarios")
+    if len(scenarios) > current_app.config['API_BATCH_MAX']:
+        raise APIError("At most {} scenarios per request".format(current_app.config['API_BATCH_MAX']))
+    params = []
+    for i, fields in enumerate(scenarios):
+        try:
+            params.append(_scenario(fields if isinstance(fields, dict) else {}))
+        except APIError as e:
+            raise APIError("Scenario {}: {}".format(i, e.message), e.errors)
+
+    # each scenario keeps the model size of the single scenario endpoint, so the sweep is run once per geometry
+    rows = [None] * len(params)
+    groups = collections.defaultdict(list)
+    for i, p in enumerate(params):
+        f_central = wb.cached_wavelet(p['wv_len'] / 1000, p['wv_dt'] / 1000, p['wv_type'], p['freq']).f_central
+        groups[wb.get_model_geometry(f_central, p['wv_dt'] / 1000)].append(i)
+    for (width, height), indices in groups.items():
+        sweep = wb.tuning_sweep(
+            [[params[i][key] / 1000 for key in ['vp_1', 'rho_1', 'vp_2', 'rho_2', 'vp_3', 'rho_3']] for i in indices],
+            w_type=[params[i]['wv_type'] for i in indices], f=[params[i]['freq'] for i in indices],
+            duration=[params[i]['wv_len'] / 1000 for i in indices], dt=[params[i]['wv_dt'] / 1000 for i in indices],
+            width=width, height=height, store=wedge_store
+        )
+        for row, i in enumerate(indices):
+            rows[i] = (sweep, row)
+
+    results = []
+    arrays = {}
+    for i, (sweep, row) in enumerate(rows):
+        results.append(_measurements(params[i], sweep.f_central[row], sweep.tuning[row], sweep.onset[row]))
+        for name in names:
+            arrays['{}_{}'.format(name, i)] = getattr(sweep, name)[row]
+    if fmt == 'npz':
+        # one array per measurement, with one value per scenario
+        columns = {key: np.array([result[key] for result in results]) for key in results[0] if key != 'permalink'}
+        return _respond(fmt, columns, arrays)
+    for i, result in enumerate(results):
+        result['arrays'] = _encode_arrays(fmt, {name: arrays['{}_{}'.format(name, i)] for name in names})
+    return jsonify({'scenarios': results})
@@ -18,46 +18,15 @@ limitations under the License.
 
 import numpy as np
 
-from bokeh.models import ColumnDataSource
+from bokeh.models import Range1d
 from bokeh.plotting import figure
 
+from .bokeh_sources import columns
+from .bokeh_templates import named_source, template
 
-def plot_amplitude_spectrum(w, dt):
-    """
-
-    Parameters
-    ----------
-    w : ndarray
-        numpy ndarray containing wavelet amplitude values
-    dt : float
-        wavelet sample increment
-
-    Returns
-    -------
-
-    """
-    # get the amplitude spectrum of the wavelet using discrete Fourier transform
-    # note: power_spectrum = amplitude_spectrum**2 and dB scale if 20*np.log10(amplitude_spectrum)
-    amplitude_spectrum = abs(np.fft.rfft(w))
-    # sometimes there will be zeros in the amplitude spectrum, which results in a RuntimeWarning in np.log10
-    # handle this by temporarily raising the divide by zero warning to a FloatingPointError
-    # and replace the zero with the minimum value of the non-zero data
-    with np.errstate(divide='raise'):
-        try:
-            amp_dB = 20 * np.log10(amplitude_spectrum/np.max(amplitude_spectrum))
-        except FloatingPointError:
-            amplitude_spectrum[amplitude_spectrum == 0] = np.min(amplitude_spectrum[np.nonzero(amplitude_spectrum)])
-            amp_dB = 20 * np.log10(amplitude_spectrum/np.max(amplitude_spectrum))
-    phase = np.angle(amplitude_spectrum, deg=True)
-    nyquist = 1 / (2 * dt)
-
-    # define x-axis
-    x = np.fft.rfftfreq(w.size, d=dt)
-
-    # set up column data source
-    spectrum_source = ColumnDataSource(data=dict(x=x, y=amp_dB))
-    phase_source = ColumnDataSource(data=dict(x=x, y=phase))
 
+def _spectrum_figures():
+    """Amplitude spectrum and phase figures without data, the static part of plot_amplitude_spectrum"""
     # set up spectrum plot
     spec_TOOLTIPS = [
         ("Frequency", "$x Hz"),
@@ -66,8 +35,8 @@ def plot_amplitude_spectrum(w, dt):
 
     spectrum_plot = figure(plot_height=250, plot_width=250, tooltips=spec_TOOLTIPS, title="Amplitude Spectrum",
                            tools="crosshair, pan, box_zoom, reset, save",
-                           x_range=[0, np.max(x)])
-    spectrum_plot.line('x', 'y', source=spectrum_source, line_width=3, line_alpha=0.6)
+                           x_range=Range1d(0, 1, name='spectrum_x_range'))
+    spectrum_plot.line('x', 'y', source=named_source('spectrum', 'x', 'y'), line_width=3, line_alpha=0.6)
     spectrum_plot.xaxis.axis_label = "Frequency (Hz)"
     spectrum_plot.yaxis.axis_label = "Amplitude (dB)"
     spectrum_plot.toolbar.logo = None
@@ -80,10 +49,66 @@ def plot_amplitude_spectrum(w, dt):
 
     phase_plot = figure(plot_height=250, plot_width=250, tooltips=phase_TOOLTIPS, title="Phase",
                         tools="crosshair, pan, reset, save, wheel_zoom",
-                        x_range=[0, nyquist], y_range=[-180, 180])
-    phase_plot.line('x', 'y', source=phase_source, line_width=3, line_alpha=0.6)
+                        x_range=Range1d(0, 1, name='phase_x_range'), y_range=[-180, 180])
+    phase_plot.line('x', 'y', source=named_source('phase', 'x', 'y'), line_width=3, line_alpha=0.6)
     phase_plot.xaxis.axis_label = "Frequency (Hz)"
     phase_plot.yaxis.axis_label = "Phase (degrees)"
     phase_plot.toolbar.logo = None
 
     return spectrum_plot, phase_plot
+
+
+def _values(w, dt, spectrum=None, freqs=None):
+    # get the amplitude spectrum of the wavelet using discrete Fourier transform
+    # note: power_spectrum = amplitude_spectrum**2 and dB scale if 20*np.log10(amplitude_spectrum)
+    if spectrum is None:
+        spectrum = np.fft.rfft(w)
+    amplitude_spectrum = abs(spectrum)
+    # sometimes there will be zeros in the amplitude spectrum, which results in a RuntimeWarning in np.log10
+    # handle this by temporarily raising the divide by zero warning to a FloatingPointError
+    # and replace the zero with the minimum value of the non-zero data
+    with np.errstate(divide='raise'):
+        try:
+            amp_dB = 20 * np.log10(amplitude_spectrum/np.max(amplitude_spectrum))
+        except FloatingPointError:
+            amplitude_spectrum[amplitude_spectrum == 0] = np.min(amplitude_spectrum[np.nonzero(amplitude_spectrum)])
+            amp_dB = 20 * np.log10(amplitude_spectrum/np.max(amplitude_spectrum))
+    phase = np.angle(amplitude_spectrum, deg=True)
+    nyquist = 1 / (2 * dt)
+
+    # define x-axis
+    x = np.fft.rfftfreq(w.size, d=dt) if freqs is None else freqs
+
+    return {
+        'spectrum': {'data': columns(x=x, y=amp_dB)},
+        'phase': {'data': columns(x=x, y=phase)},
+        'spectrum_x_range': {'end': np.max(x)},
+        'phase_x_range': {'end': nyquist},
+    }
+
+
+def plot_amplitude_spectrum(w, dt, spectrum=None, freqs=None):
+    """
+
+    Parameters
+    ----------
+    w : ndarray
+        numpy ndarray containing wavelet amplitude values
+    dt : float
+        wavelet sample increment
+    spectrum : ndarray
+        precomputed np.fft.rfft(w), e.g. from wedgebuilder.cached_wavelet. Computed from w when not given
+    freqs : ndarray
+        precomputed np.fft.rfftfreq(w.size, d=dt). Computed when not given
+
+    Returns
+    -------
+
+    """
+    return template(_spectrum_figures).figure(_values(w, dt, spectrum, freqs))
+
+
+def amplitude_spectrum_items(w, dt, spectrum=None, freqs=None):
+    """JSON texts of the json_items of plot_amplitude_spectrum(w, dt, spectrum, freqs), filled into the amplitude
+    spectrum and phase figures serialized once"""
+    return template(_spectrum_figures).item(_values(w, dt, spectrum, freqs))
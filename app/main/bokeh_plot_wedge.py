@@ -19,36 +19,113 @@ limitations under the License.
 import numpy as np
 from bokeh.plotting import figure
 from bokeh.palettes import Viridis10, RdBu11
-from bokeh.models import Range1d
+from bokeh.models import HoverTool, LinearColorMapper, Range1d
 
+from .bokeh_sources import column, columns, lttb
+from .bokeh_templates import named_source, template
+
+# how plot_earth_model and plot_synth send their image to the browser, from the largest payload to the smallest:
+# float64 is the array itself, float32 halves it, rgba sends the colours, mapped here, as one uint32 per pixel and
+# uint8 sends one byte per pixel, the level of each value, that BokehJS maps to a colour. Exact values stay
+# available on hover from a hidden image sampling every LOOKUP_STEP-th value in both directions
+ENCODINGS = ['float64', 'float32', 'uint8', 'rgba']
+LOOKUP_STEP = 4
+PLOT_HEIGHT = 300
+PLOT_WIDTH = 400
+IMAGE_COLUMNS = ['image', 'x', 'y', 'dw', 'dh']
+
+
+def _axis(n, dt):
+    """Builds a two-way time axis in milliseconds that grows by dt per sample (or trace)"""
+    axis = np.zeros(n)
+    axis[1:] += dt
+    return np.cumsum(axis) * 1000
+
+
+def _quantize(image, levels):
+    """Returns the level, 0 to levels - 1, of every value of image, its range split in levels equal intervals"""
+    low = image.min()
+    diff = image.max() - low
+    if diff == 0:
+        return np.zeros(image.shape, dtype=np.uint8)
+    return np.minimum((image - low) / diff * levels, levels - 1).astype(np.uint8)
+
+
+def _rgba(palette):
+    """Returns the hex colours of palette packed as the little endian uint32 RGBA values image_rgba expects"""
+    rgb = np.array([[int(color[i:i + 2], 16) for i in (1, 3, 5)] for color in palette], dtype=np.uint32)
+    return rgb[:, 0] | (rgb[:, 1] << 8) | (rgb[:, 2] << 16) | np.uint32(255 << 24)
+
+
+def _add_image(plot, palette, encoding):
+    """Adds the glyphs drawing an image in the given encoding to plot, reading the sources named image and lookup
+
+    Returns
+    -------
+    GlyphRenderer
+        renderer whose image holds the exact values, for the hover tool
 
-def plot_earth_model(imp, dt):
     """
+    fields = dict((column, column) for column in IMAGE_COLUMNS)
+    source = named_source('image', *IMAGE_COLUMNS)
+    if encoding in ['float64', 'float32']:
+        return plot.image(source=source, palette=palette, level="image", **fields)
+    if encoding == 'uint8':
+        color_mapper = LinearColorMapper(palette=palette, low=0, high=len(palette), name='color_mapper')
+        plot.image(source=source, color_mapper=color_mapper, level="image", **fields)
+    else:
+        plot.image_rgba(source=source, level="image", **fields)
+    # values at a lower resolution, drawn invisible, for the hover tool to read
+    return plot.image(source=named_source('lookup', *IMAGE_COLUMNS), palette=palette, global_alpha=0,
+                      level="image", **fields)
+
+
+def _image_values(image, palette, encoding='float64', levels=0, **extent):
+    """Data of the image drawn by _add_image
 
     Parameters
     ----------
-    imp : ndarray
-        Impedance representation of the wedge layers
-    dt : float
-        wavelet sample increment in seconds
+    image : ndarray
+        2D array of values, colour mapped linearly from its min to its max
+    palette : sequence of str
+        hex colours
+    encoding : str
+        one of ENCODINGS
+    levels : int
+        number of levels of the uint8 encoding, at most 256. 0 picks the size of the palette. A multiple of the
+        size of the palette draws the same colours as the float encodings
+    extent
+        x, y, dw and dh of the image
 
     Returns
     -------
+    dict
+        attribute values of the models named image, lookup and color_mapper, as FigureTemplate takes them
 
     """
-    # bokeh's image plots upside down, so need to flip the impedance ndarray
-    imp = np.flipud(imp)
+    extent = {name: column([value]) for name, value in extent.items()}
+    if encoding in ['float64', 'float32']:
+        return {'image': {'data': dict(extent, image=[image.astype(encoding, copy=False)])}}
+    if encoding == 'uint8':
+        levels = levels or len(palette)
+        if not 0 < levels <= 256:
+            raise ValueError("levels must be between 1 and 256")
+        values = {'image': {'data': dict(extent, image=[_quantize(image, levels)])},
+                  'color_mapper': {'high': levels}}
+    else:
+        values = {'image': {'data': dict(extent, image=[_rgba(palette)[_quantize(image, len(palette))]])}}
+    lookup = image[::LOOKUP_STEP, ::LOOKUP_STEP].astype(np.float32)
+    values['lookup'] = {'data': dict(extent, image=[lookup])}
+    return values
 
-    # time axis in TWT (millisec)
-    t = np.zeros(imp.shape[0])
-    t[1:] += dt
-    t = np.cumsum(t) * 1000
 
-    # wedge thickness in TWT (millisec)
-    wt = np.zeros(imp.shape[1])
-    wt[1:] += dt
-    wt = np.cumsum(wt) * 1000
+def _check_encoding(encoding):
+    if encoding not in ENCODINGS:
+        raise ValueError("encoding must be one of {}".format(', '.join(ENCODINGS)))
+
 
+def _earth_model_figure(encoding):
+    """Earth model figure without data for the image encoding, the static part of plot_earth_model"""
     # set plot configuration
     TOOLTIPS = [
         ("Impedance", "@image{int}"),
@@ -57,52 +134,133 @@ def plot_earth_model(imp, dt):
     ]
     tools = "crosshair, pan, reset, save, wheel_zoom"
     plot = figure(
-        plot_height=300, plot_width=400,
-        tooltips=TOOLTIPS, title="Earth Model",
-        tools=tools,
-        x_range=Range1d(0, 100), x_axis_label="TWT Wedge Thickness (ms)",
-        y_range=[np.max(t), 0], y_axis_label="TWT (ms)"
+        plot_height=PLOT_HEIGHT, plot_width=PLOT_WIDTH,
+        title="Earth Model", tools=tools,
+        x_range=Range1d(0, 1, name='x_range'), x_axis_label="TWT Wedge Thickness (ms)",
+        y_range=Range1d(1, 0, name='y_range'), y_axis_label="TWT (ms)"
     )
-    plot.image(image=[imp], x=0, y=np.max(t), dw=np.max(wt), dh=np.max(t), palette=Viridis10[::-1],
-               level="image")
+    image = _add_image(plot, Viridis10[::-1], encoding)
+    plot.add_tools(HoverTool(tooltips=TOOLTIPS, renderers=[image]))
     plot.grid.grid_line_width = 0
     plot.toolbar.logo = None
-
     return plot
 
 
-def plot_synth(synth, dt, z_tuning, z_onset):
+def _earth_model_values(imp, dt, t=None, wt=None, encoding='float64', levels=0):
+    _check_encoding(encoding)
+    # bokeh's image plots upside down, so need to flip the impedance ndarray
+    imp = np.flipud(imp)
+
+    # time axis in TWT (millisec)
+    if t is None:
+        t = _axis(imp.shape[0], dt)
+
+    # wedge thickness in TWT (millisec)
+    if wt is None:
+        wt = _axis(imp.shape[1], dt)
+
+    values = _image_values(imp, Viridis10[::-1], encoding, levels, x=0, y=np.max(t), dw=np.max(wt), dh=np.max(t))
+    values['x_range'] = {'end': np.max(wt)}
+    values['y_range'] = {'start': np.max(t)}
+    return values
+
+
+def plot_earth_model(imp, dt, t=None, wt=None, encoding='float64', levels=0):
     """
 
     Parameters
     ----------
-    synth : ndarray
-        synthetic trace
+    imp : ndarray
+        Impedance representation of the wedge layers
     dt : float
-        wavelet sample increment
-    z_tuning : float
-        tuning thickness in TWT milliseconds
-    z_onset : int
-        onset of tuning in TWT milliseconds
+        wavelet sample increment in seconds
+    t : ndarray
+        optional time axis in TWT milliseconds, e.g. WedgeAnalysis.t, computed from dt when not supplied
+    wt : ndarray
+        optional wedge thickness axis in TWT milliseconds, e.g. WedgeAnalysis.wt, computed from dt when not supplied
+    encoding : str
+        how the image is sent, one of ENCODINGS
+    levels : int
+        number of levels of the uint8 encoding, 0 picks the size of the palette
 
     Returns
     -------
 
     """
-    # bokeh's image plots upside down, so need to flip the impedance ndarray
-    synth = np.flipud(synth)
+    values = _earth_model_values(imp, dt, t, wt, encoding, levels)
+    return template(_earth_model_figure, encoding).figure(values)
 
-    # time axis in TWT (millisec)
-    t = np.zeros(synth.shape[0])
-    t[1:] += dt
-    t = np.cumsum(t) * 1000
 
-    # wedge thickness in TWT (millisec)
-    wt = np.zeros(synth.shape[1])
-    wt[1:] += dt
-    wt = np.cumsum(wt) * 1000
-    tuning_idx = np.argwhere(wt == z_tuning)[0][0]  # get TWT tuning thickness index
+def earth_model_item(imp, dt, t=None, wt=None, encoding='float64', levels=0):
+    """JSON text of the json_item of plot_earth_model with the same arguments, filled into the earth model figure
+    serialized once"""
+    values = _earth_model_values(imp, dt, t, wt, encoding, levels)
+    return template(_earth_model_figure, encoding).item(values)
+
+
+def _wiggles(synth, t, wt, dx, fill=False, max_points=0):
+    """Builds the wiggle trace overlay of every dx-th trace of a flipped synthetic in one vectorized operation
+
+    Parameters
+    ----------
+    synth : ndarray
+        (n, width) synthetic, flipped upside down for plotting
+    t : ndarray
+        (n, ) time axis in TWT milliseconds
+    wt : ndarray
+        (width, ) wedge thickness axis in TWT milliseconds
+    dx : int
+        trace increment, also the horizontal scale of each wiggle
+    fill : bool
+        also build the polygons filling the positive lobes, otherwise left out of the document
+    max_points : int
+        longer wiggles are downsampled to this many samples with lttb, 0 keeps every sample
+
+    Returns
+    -------
+    dict
+        ColumnDataSource columns, one row per wiggle: xs and ys of the wiggle line and, when fill is set,
+        fill_xs and fill_ys of the polygon filling its positive lobes
+
+    """
+    synth_min = synth.min()  # min value of synthetic for normalization
+    synth_diff = synth.max() - synth_min
+    traces = synth.T[::dx]
+    x0 = wt[::dx][:, np.newaxis]
+    xs = x0 + ((traces - synth_min) / synth_diff - 0.5) * 4 * dx
+    ys = np.flipud(t)
+    rows = None  # time axis of each wiggle, once they are downsampled
+    if 0 < max_points < len(ys):
+        indices = lttb(ys, xs, max_points)
+        xs = np.take_along_axis(xs, indices, axis=1)
+        rows = ys[indices]
+    data = dict(xs=list(xs), ys=[ys] * len(xs) if rows is None else list(rows))
+    if not fill:
+        return data
+    # variable area: fill between the zero amplitude line and the positive lobes, closed along the zero line
+    baseline = x0 + ((0 - synth_min) / synth_diff - 0.5) * 4 * dx
+    fill_xs = np.hstack([np.maximum(xs, baseline), np.repeat(baseline, xs.shape[1], axis=1)])
+    if rows is None:
+        fill_ys = [np.concatenate([ys, ys[::-1]])] * len(xs)
+    else:
+        fill_ys = list(np.hstack([rows, rows[:, ::-1]]))
+    data.update(fill_xs=list(fill_xs), fill_ys=fill_ys)
+    return data
 
+
+def _synth_figure(encoding, fill, onset):
+    """Synthetic figure without data, the static part of plot_synth
+
+    Parameters
+    ----------
+    encoding : str
+        image encoding, one of ENCODINGS
+    fill : bool
+        fill the positive lobes of the wiggle traces
+    onset : bool
+        draw the trace at the onset of tuning
+
+    """
     # set plot configuration
     TOOLTIPS = [
         ("Amplitude", "@image"),
@@ -111,46 +269,124 @@ def plot_synth(synth, dt, z_tuning, z_onset):
     ]
     tools = "crosshair, pan, reset, save, wheel_zoom, box_zoom"
     plot = figure(
-        plot_height=300, plot_width=400,
-        tooltips=TOOLTIPS, tools=tools, title="Synthetic Wedge Model",
-        x_range=Range1d(0, wt[-1]), x_axis_label="TWT Wedge Thickness (ms)",
-        y_range=[np.max(t), 0], y_axis_label="TWT (ms)"
+        plot_height=PLOT_HEIGHT, plot_width=PLOT_WIDTH,
+        tools=tools, title="Synthetic Wedge Model",
+        x_range=Range1d(0, 1, name='x_range'), x_axis_label="TWT Wedge Thickness (ms)",
+        y_range=Range1d(1, 0, name='y_range'), y_axis_label="TWT (ms)"
     )
 
     # plotting wiggle trace with a little help from https://github.com/fatiando/fatiando
-    # using slice notation to get every second trace
+    # every second trace is drawn, all of them by one multi_line glyph reading one data source
+    wiggle_columns = ['xs', 'ys'] + (['fill_xs', 'fill_ys'] if fill else [])
+    wiggles = named_source('wiggles', *wiggle_columns)
+    if fill:
+        plot.patches(xs="fill_xs", ys="fill_ys", source=wiggles, fill_color="black", fill_alpha=0.3, line_alpha=0)
+    plot.multi_line(xs="xs", ys="ys", source=wiggles, line_color="black", line_alpha=0.5)
+    # the emphasized traces share one data source, so the time axis is sent once
+    source = named_source('traces', 't', 'tuning', *(['onset'] if onset else []))
+    plot.line('tuning', 't', source=source, line_color="black", line_width=3)
+    if onset:
+        plot.line('onset', 't', source=source, line_color="black", line_width=2, line_alpha=0.7, line_dash="dashed")
+
+    # plot synthetic as image
+    image = _add_image(plot, RdBu11[::-1], encoding)
+    plot.add_tools(HoverTool(tooltips=TOOLTIPS, renderers=[image]))
+
+    plot.grid.grid_line_width = 0
+    plot.toolbar.logo = None
+    return plot
+
+
+def _synth_values(synth, dt, z_tuning, z_onset, t=None, wt=None, fill=False, encoding='float64', levels=0,
+                  max_points=None):
+    _check_encoding(encoding)
+    # bokeh's image plots upside down, so need to flip the impedance ndarray
+    synth = np.flipud(synth)
+
+    # time axis in TWT (millisec)
+    if t is None:
+        t = _axis(synth.shape[0], dt)
+
+    # wedge thickness in TWT (millisec)
+    if wt is None:
+        wt = _axis(synth.shape[1], dt)
+    tuning_idx = np.argwhere(wt == z_tuning)[0][0]  # get TWT tuning thickness index
+
     dx = int(round(((np.max(wt) - np.min(wt))/synth.shape[1])*2))  # x-axis increment
     synth_min = synth.min()  # min value of synthetic for normalization
     synth_max = synth.max()  # max value of synthetic for normalization
     synth_diff = synth_max - synth_min
-    for i, trace in enumerate(synth.transpose()[::dx, :]):
-        tr = (((trace - synth_min)/synth_diff) - 0.5)*4*dx
-        x = wt[i*dx]
-        plot.line(x=x + tr, y=np.flipud(t), line_color="black", line_alpha=0.5)
-    # plot synthetic trace at measured tuning TWT thickness
-    plot.line(
-        x=(tuning_idx * dt * 1000 + (((synth.transpose()[tuning_idx, :] - synth_min)/synth_diff) - 0.5) * 4 * dx),
-        y=np.flipud(t), line_color="black", line_width=3
-    )
+    if max_points is None:
+        max_points = PLOT_HEIGHT
+    wiggles = _wiggles(synth, t, wt, dx, fill=fill, max_points=max_points)
+    traces = dict(t=np.flipud(t))
+    # synthetic trace at measured tuning TWT thickness
+    traces['tuning'] = wt[tuning_idx] + (((synth.transpose()[tuning_idx, :] - synth_min)/synth_diff) - 0.5) * 4 * dx
 
     # If wavelet frequency is low (<10 Hz) and sample increment is small (==0.001), the wedge is not thick enough
     # to establish the tuning onset thickness, so we will omit it from the plot in that case.
     try:
         # get TWT onset tuning thickness index
         onset_idx = np.argwhere(wt.astype(np.int64) == z_onset)[0][0]
-        # plot synthetic trace at measured onset tuning TWT thickness
-        plot.line(
-            x=(onset_idx * dt * 1000 + (((synth.transpose()[onset_idx, :] - synth_min)/synth_diff) - 0.5) * 4 * dx),
-            y=np.flipud(t), line_color="black", line_width=2, line_alpha=0.7, line_dash="dashed"
-        )
+        # synthetic trace at measured onset tuning TWT thickness
+        traces['onset'] = wt[onset_idx] + (((synth.transpose()[onset_idx, :] - synth_min)/synth_diff) - 0.5) * 4 * dx
     except IndexError:
         pass
+    if 0 < max_points < len(traces['t']):
+        # one set of samples for both traces, so they still share the time axis
+        names = [name for name in traces if name != 't']
+        indices = np.unique(lttb(traces['t'], np.vstack([traces[name] for name in names]), max_points))
+        traces = {name: values[indices] for name, values in traces.items()}
 
-    # plot synthetic as image
-    plot.image(image=[synth], x=0, y=np.max(t), dw=wt[-1], dh=np.max(t),
-               palette=RdBu11[::-1], level="image")
+    values = _image_values(synth, RdBu11[::-1], encoding, levels, x=0, y=np.max(t), dw=wt[-1], dh=np.max(t))
+    values.update({
+        'wiggles': {'data': columns(**wiggles)},
+        'traces': {'data': columns(**traces)},
+        'x_range': {'end': wt[-1]},
+        'y_range': {'start': np.max(t)},
+    })
+    return (encoding, fill, 'onset' in traces), values
 
-    plot.grid.grid_line_width = 0
-    plot.toolbar.logo = None
 
-    return plot
+def plot_synth(synth, dt, z_tuning, z_onset, t=None, wt=None, fill=False, encoding='float64', levels=0,
+               max_points=None):
+    """
+
+    Parameters
+    ----------
+    synth : ndarray
+        synthetic trace
+    dt : float
+        wavelet sample increment
+    z_tuning : float
+        tuning thickness in TWT milliseconds
+    z_onset : int
+        onset of tuning in TWT milliseconds
+    t : ndarray
+        optional time axis in TWT milliseconds, e.g. WedgeAnalysis.t, computed from dt when not supplied
+    wt : ndarray
+        optional wedge thickness axis in TWT milliseconds, e.g. WedgeAnalysis.wt, computed from dt when not supplied
+    fill : bool
+        fill the positive lobes of the wiggle traces (variable area display)
+    encoding : str
+        how the image is sent, one of ENCODINGS
+    levels : int
+        number of levels of the uint8 encoding, 0 picks the size of the palette
+    max_points : int
+        traces longer than this are downsampled with lttb, keeping their peaks and troughs. Defaults to the plot
+        height in pixels, 0 keeps every sample
+
+    Returns
+    -------
+
+    """
+    options, values = _synth_values(synth, dt, z_tuning, z_onset, t, wt, fill, encoding, levels, max_points)
+    return template(_synth_figure, *options).figure(values)
+
+
+def synth_item(synth, dt, z_tuning, z_onset, t=None, wt=None, fill=False, encoding='float64', levels=0,
+               max_points=None):
+    """JSON text of the json_item of plot_synth with the same arguments, filled into the synthetic figure
+    serialized once"""
+    options, values = _synth_values(synth, dt, z_tuning, z_onset, t, wt, fill, encoding, levels, max_points)
+    return template(_synth_figure, *options).item(values)
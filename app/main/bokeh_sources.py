@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+import gzip
+import json
+
+import numpy as np
+from bokeh.models import ColumnDataSource
+
+ColumnSize = collections.namedtuple('ColumnSize', ['source', 'column', 'bytes'])
+PlotSize = collections.namedtuple('PlotSize', ['bytes', 'gzip_bytes', 'data_bytes', 'columns'])
+
+INT32 = np.iinfo(np.int32)
+
+
+def column(values):
+    """Returns values as a contiguous float32 or int32 array, the compact types Bokeh serializes base64 encoded
+
+    Parameters
+    ----------
+    values : array_like
+        numbers, e.g. an ndarray of any real dtype or a list
+
+    Returns
+    -------
+    ndarray
+        int32 for integer and boolean values, float32 otherwise
+
+    Raises
+    ------
+    ValueError
+        for complex values and for integers out of the int32 range
+
+    """
+    array = np.asarray(values)
+    if np.iscomplexobj(array):
+        raise ValueError("complex values cannot be plotted, take their abs or angle first")
+    if array.dtype.kind in 'biu':
+        if array.size and (array.min() < INT32.min or array.max() > INT32.max):
+            raise ValueError("integer values out of the int32 range")
+        return np.ascontiguousarray(array, dtype=np.int32)
+    return np.ascontiguousarray(array, dtype=np.float32)
+
+
+def columns(**values):
+    """Converts every column of a data source with column
+
+    A column given as a list of arrays, e.g. the xs and ys of multi_line or patches, is converted item by item. The
+    same array given more than once, like the time axis repeated for every wiggle, is converted only once.
+
+    Parameters
+    ----------
+    values
+        column name and values of each column
+
+    Returns
+    -------
+    dict
+        converted columns by name, the data of a ColumnDataSource
+
+    """
+    converted = {}
+
+    def convert(array):
+        key = id(array)
+        if key not in converted:
+            converted[key] = (array, column(array))  # holding array keeps its id from being reused
+        return converted[key][1]
+
+    data = {}
+    for name, value in values.items():
+        if isinstance(value, list) and value and np.ndim(value[0]) > 0:
+            data[name] = [convert(item) for item in value]
+        else:
+            data[name] = convert(value)
+    return data
+
+
+def data_source(**values):
+    """Builds a ColumnDataSource of columns converted by columns"""
+    return ColumnDataSource(data=columns(**values))
+
+
+def _size(value):
+    return len(json.dumps(value, separators=(',', ':')))
+
+
+def plot_size(item):
+    """Reports how big a serialized plot is and which data source columns make it so
+
+    Parameters
+    ----------
+    item : str
+        JSON text of a Bokeh json_item, as returned by the plot stages
+
+    Returns
+    -------
+    PlotSize
+        bytes of the JSON text, once gzip compressed, of data source columns, and the ColumnSize of every column,
+        largest first
+
+    """
+    references = json.loads(item)['doc']['roots']['references']
+    columns = []
+    for reference in references:
+        if reference['type'] != 'ColumnDataSource':
+            continue
+        for name, value in reference['attributes']['data'].items():
+            columns.append(ColumnSize(reference['id'], name, _size(value)))
+    columns.sort(key=lambda size: size.bytes, reverse=True)
+    data = item.encode('utf-8')
+    return PlotSize(len(data), len(gzip.compress(data)), sum(size.bytes for size in columns), columns)
+
+
+def lttb(x, y, n, keep=()):
+    """Picks the samples of one or more series that best preserve their shape, Largest-Triangle-Three-Buckets style
+
+    The first and last samples are kept and the others are split in n - 2 buckets of consecutive samples. Each
+    bucket keeps the sample forming the largest triangle with the averages of the neighbouring buckets, all buckets
+    at once, which differs from the sequential algorithm only in using the average of the previous bucket rather than
+    its chosen sample. The maximum and the minimum of each series, and the samples in keep, always replace the choice
+    of their bucket, so peaks and troughs survive.
+
+    Parameters
+    ----------
+    x : ndarray
+        (size, ) monotonic sample positions
+    y : ndarray
+        (size, ) values of one series or (rows, size) values of several series sharing x
+    n : int
+        number of samples to keep, at least 3
+    keep : sequence of int
+        indices of samples that must be kept, at most one per bucket
+
+    Returns
+    -------
+    ndarray
+        (n, ) or (rows, n) increasing indices of the samples kept, all of them when size <= n
+
+    """
+    y = np.asarray(y)
+    rows = np.atleast_2d(y)
+    size = rows.shape[1]
+    if size <= n or n < 3:
+        indices = np.arange(size)
+        return indices if y.ndim == 1 else np.tile(indices, (rows.shape[0], 1))
+    # bucket i holds the samples edges[i] to edges[i + 1] - 1, the first and last samples are not in any bucket
+    edges = np.floor(np.linspace(1, size - 1, n - 1)).astype(np.int64)
+    starts = edges[:-1] - 1  # first index of each bucket in the middle samples x[1:-1]
+    counts = np.diff(edges)
+    bucket = np.repeat(np.arange(n - 2), counts)
+    mid_x = x[1:-1]
+    mid_y = rows[:, 1:-1]
+    avg_x = np.add.reduceat(mid_x, starts) / counts
+    avg_y = np.add.reduceat(mid_y, starts, axis=1) / counts
+    prev_x = np.concatenate([x[:1], avg_x[:-1]])[bucket]
+    next_x = np.concatenate([avg_x[1:], x[-1:]])[bucket]
+    prev_y = np.hstack([rows[:, :1], avg_y[:, :-1]])[:, bucket]
+    next_y = np.hstack([avg_y[:, 1:], rows[:, -1:]])[:, bucket]
+    area = np.abs((prev_x - next_x) * (mid_y - prev_y) - (prev_x - mid_x) * (next_y - prev_y))
+    # first index of the largest area of each bucket
+    largest = np.maximum.reduceat(area, starts, axis=1)[:, bucket]
+    picked = np.minimum.reduceat(np.where(area == largest, np.arange(size - 2), size), starts, axis=1)
+    row_index = np.arange(rows.shape[0])
+    for index in [np.argmax(rows, axis=1), np.argmin(rows, axis=1)]:
+        inner = (index > 0) & (index < size - 1)
+        picked[row_index[inner], bucket[index[inner] - 1]] = index[inner] - 1
+    for index in keep:
+        if 0 < index < size - 1:
+            picked[:, bucket[index - 1]] = index - 1
+    indices = np.hstack([np.zeros((rows.shape[0], 1), dtype=np.int64), picked + 1,
+                         np.full((rows.shape[0], 1), size - 1, dtype=np.int64)])
+    return indices[0] if y.ndim == 1 else indices
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import functools
+import json
+import threading
+
+from bokeh.core.json_encoder import BokehJSONEncoder
+from bokeh.embed import json_item
+from bokeh.model import get_class
+from bokeh.models import ColumnDataSource
+from bokeh.util.serialization import transform_column_source_data
+
+
+@functools.lru_cache(maxsize=None)
+def _default(model_type, attribute):
+    model = get_class(model_type)
+    return model.lookup(attribute).class_default(model)
+
+
+class FigureTemplate(object):
+    """Static structure of a figure, built once per process and filled with the data of each request
+
+    build returns a new figure, or a tuple of figures, whose data sources, ranges and any other model that changes
+    with the scenario have a name. Their new attributes are given as values, a dict of attribute values by model name,
+    e.g. {'wavelet': {'data': {'x': x, 'y': y}}, 'x_range': {'start': 0, 'end': 100}}.
+
+    figure builds a new figure and sets values on it. item fills values straight into the json_item of the figure,
+    serialized on first use, so a request builds no Bokeh model at all. Both give the same plot.
+
+    Parameters
+    ----------
+    build : callable
+        called without arguments, returns the figure(s) with placeholder values
+
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self._skeletons = None
+        self._lock = threading.Lock()
+
+    def figure(self, values):
+        """Builds the figure(s) and sets values, the cold path"""
+        plots = self.build()
+        for plot in (plots if isinstance(plots, tuple) else (plots,)):
+            for name, attributes in values.items():
+                model = plot.select_one({'name': name})
+                if model is None:
+                    continue
+                for attribute, value in attributes.items():
+                    setattr(model, attribute, value)
+        return plots
+
+    def _skeleton(self):
+        """JSON text of the json_item of each figure, with the position of every named model in its references"""
+        with self._lock:
+            if self._skeletons is None:
+                plots = self.build()
+                skeletons = []
+                for plot in (plots if isinstance(plots, tuple) else (plots,)):
+                    item = json_item(plot)
+                    references = item['doc']['roots']['references']
+                    named = {reference['attributes']['name']: index for index, reference in enumerate(references)
+                             if reference['attributes'].get('name')}
+                    skeletons.append((json.dumps(item), named))
+                self._skeletons = (isinstance(plots, tuple), skeletons)
+            return self._skeletons
+
+    def item(self, values):
+        """Returns the JSON text of the json_item of the figure(s) filled with values, the templated path
+
+        Returns
+        -------
+        str or tuple of str
+            one JSON text per figure, as the stages serve them
+
+        """
+        many, skeletons = self._skeleton()
+        items = []
+        for text, named in skeletons:
+            item = json.loads(text)
+            references = item['doc']['roots']['references']
+            for name, attributes in values.items():
+                if name not in named:
+                    continue
+                reference = references[named[name]]
+                for attribute, value in attributes.items():
+                    if reference['type'] == 'ColumnDataSource' and attribute == 'data':
+                        value = transform_column_source_data(value)
+                    elif value == _default(reference['type'], attribute):
+                        # like json_item, leave default values out
+                        reference['attributes'].pop(attribute, None)
+                        continue
+                    reference['attributes'][attribute] = value
+            items.append(json.dumps(item, cls=BokehJSONEncoder))
+        return tuple(items) if many else items[0]
+
+
+def named_source(name, *columns):
+    """Empty ColumnDataSource with the given name and column names, the placeholder of a template"""
+    return ColumnDataSource(data={column: [] for column in columns}, name=name)
+
+
+_templates = {}
+
+
+def template(build, *options):
+    """Returns the FigureTemplate of build(*options), created on first use and shared by the process
+
+    Options are the arguments that change the structure of a figure, e.g. the image encoding, so every combination
+    has its own template.
+
+    """
+    key = (build, options)
+    if key not in _templates:
+        _templates.setdefault(key, FigureTemplate(functools.partial(build, *options)))
+    return _templates[key]
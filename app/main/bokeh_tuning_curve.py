@@ -18,53 +18,92 @@ limitations under the License.
 
 import numpy as np
 from bokeh.plotting import figure
-from bokeh.models import ColumnDataSource, LinearAxis, Range1d, Span
+from bokeh.models import LinearAxis, Range1d, Span
 
+from .bokeh_sources import columns, lttb
+from .bokeh_templates import named_source, template
 
-def plot_tuning_curve(z, amp, z_apparent, z_tuning, z_onset):
-    """
-
-    Parameters
-    ----------
-    z : ndarray
-        wedge thickness in milliseconds
-    amp : ndarray
-        amplitude along top of wedge
-    z_apparent : ndarray
-        apparent wedge thickness in milliseconds
-    z_tuning : float
-        measured tuning thickness
-    z_onset : float
-        measured onset of tuning
+PLOT_WIDTH = 400
 
-    Returns
-    -------
 
-    """
-    min_amp = np.min(np.abs(amp))
-    max_amp = np.max(np.max(amp))
-    source = ColumnDataSource(data=dict(x=z, y=amp, z=z_apparent))
+def _tuning_curve_figure():
+    """Tuning curve figure without data, the static part of plot_tuning_curve"""
     TOOLTIPS = [
         ("Amplitude", "$y{1.111}"),
         ("TWT thickness", "$x{1.1} ms")
     ]
     tools = "crosshair, pan, reset, save, wheel_zoom, box_zoom"
     plot = figure(
-        plot_height=300, plot_width=400,
+        plot_height=300, plot_width=PLOT_WIDTH,
         tooltips=TOOLTIPS, title="Tuning Curve", tools=tools,
         x_axis_label="TWT thickness (ms)", y_axis_label="Abs(Amplitude)",
-        x_range=Range1d(-0.01, 100), y_range=Range1d(min_amp, max_amp + max_amp*0.1)
+        x_range=Range1d(-0.01, 1, name='x_range'), y_range=Range1d(0, 1, name='y_range')
     )
+    source = named_source('tuning_curve', 'x', 'y', 'z')
     plot.line('x', 'y', source=source, line_width=3)
     # add wedge true & measured thickness to plot
-    plot.extra_y_ranges = {"thickness": Range1d(start=0, end=100)}
+    plot.extra_y_ranges = {"thickness": Range1d(start=0, end=1, name='thickness_range')}
     plot.add_layout(LinearAxis(y_range_name="thickness", axis_label="TWT thickness (ms)"), "left")
     plot.line('x', 'x', source=source, line_width=2, line_alpha=0.6, line_color="green", y_range_name="thickness")
     plot.line('x', 'z', source=source, line_width=2, line_alpha=0.6, line_color="red", y_range_name="thickness")
-    z_tuning_vline = Span(location=z_tuning, dimension="height", line_color="black", line_width=2)
+    z_tuning_vline = Span(location=0, dimension="height", line_color="black", line_width=2, name='z_tuning')
     plot.add_layout(z_tuning_vline)
-    z_onset_vline = Span(location=z_onset, dimension="height", line_color="black", line_dash="dashed", line_width=2)
+    z_onset_vline = Span(location=0, dimension="height", line_color="black", line_dash="dashed", line_width=2,
+                         name='z_onset')
     plot.add_layout(z_onset_vline)
     plot.toolbar.logo = None
-
     return plot
+
+
+def _values(z, amp, z_apparent, z_tuning, z_onset, max_points=None):
+    min_amp = np.min(np.abs(amp))
+    max_amp = np.max(np.max(amp))
+    # widened models run past 100 ms, so both thickness axes end at the thickest trace
+    max_thickness = float(z[-1])
+    # one point per pixel is as much as the plot can show
+    if max_points is None:
+        max_points = PLOT_WIDTH
+    if 0 < max_points < len(z):
+        keep = [np.argmin(np.abs(z - z_tuning)), np.argmin(np.abs(z - z_onset))]
+        indices = np.unique(lttb(z, np.vstack([amp, z_apparent]), max_points, keep=keep))
+        z, amp, z_apparent = z[indices], amp[indices], z_apparent[indices]
+    return {
+        'tuning_curve': {'data': columns(x=z, y=amp, z=z_apparent)},
+        'x_range': {'end': max_thickness},
+        'y_range': {'start': min_amp, 'end': max_amp + max_amp*0.1},
+        'thickness_range': {'end': max_thickness},
+        'z_tuning': {'location': z_tuning},
+        'z_onset': {'location': z_onset},
+    }
+
+
+def plot_tuning_curve(z, amp, z_apparent, z_tuning, z_onset, max_points=None):
+    """
+
+    Parameters
+    ----------
+    z : ndarray
+        wedge thickness in milliseconds
+    amp : ndarray
+        amplitude along top of wedge
+    z_apparent : ndarray
+        apparent wedge thickness in milliseconds
+    z_tuning : float
+        measured tuning thickness
+    z_onset : float
+        measured onset of tuning
+    max_points : int
+        curves longer than this are downsampled with lttb, keeping their peaks and troughs and the samples at the
+        tuning and onset thicknesses. Defaults to the plot width in pixels, 0 keeps every sample
+
+    Returns
+    -------
+
+    """
+    return template(_tuning_curve_figure).figure(_values(z, amp, z_apparent, z_tuning, z_onset, max_points))
+
+
+def tuning_curve_item(z, amp, z_apparent, z_tuning, z_onset, max_points=None):
+    """JSON text of the json_item of plot_tuning_curve with the same arguments, filled into the tuning curve figure
+    serialized once"""
+    return template(_tuning_curve_figure).item(_values(z, amp, z_apparent, z_tuning, z_onset, max_points))
@@ -18,9 +18,39 @@ limitations under the License.
 
 import numpy as np
 
-from bokeh.models import ColumnDataSource
+from bokeh.models import Range1d
 from bokeh.plotting import figure
 
+from .bokeh_sources import columns
+from .bokeh_templates import named_source, template
+
+
+def _wavelet_figure():
+    """Wavelet figure without data, the static part of plot_wavelet"""
+    TOOLTIPS = [
+        ("Time", "$x ms"),
+        ("Amp", "$y")
+    ]
+    plot = figure(plot_height=250, plot_width=250, tooltips=TOOLTIPS, title="Wavelet",
+                  tools="crosshair,pan,reset,save,wheel_zoom",
+                  x_range=Range1d(name='x_range'), y_range=Range1d(name='y_range'))
+    plot.line('x', 'y', source=named_source('wavelet', 'x', 'y'), line_width=3, line_alpha=0.6)
+    plot.xaxis.axis_label = "Time (ms)"
+    return plot
+
+
+def _values(w, duration):
+    # set up data
+    start = int(duration * 1000 / 2 * - 1 - 1)
+    stop = int(duration * 1000 / 2)
+    num = len(w)
+    x = np.linspace(start, stop, num)
+    return {
+        'wavelet': {'data': columns(x=x, y=w)},
+        'x_range': {'start': np.min(x), 'end': np.max(x)},
+        'y_range': {'start': np.min(w) - 0.1, 'end': np.max(w) + 0.1},
+    }
+
 
 def plot_wavelet(w, duration):
     """
@@ -36,22 +66,9 @@ def plot_wavelet(w, duration):
     -------
 
     """
-    # set up data
-    start = int(duration * 1000 / 2 * - 1 - 1)
-    stop = int(duration * 1000 / 2)
-    num = len(w)
-    x = np.linspace(start, stop, num)
-    source = ColumnDataSource(data=dict(x=x, y=w))
+    return template(_wavelet_figure).figure(_values(w, duration))
 
-    # set up plot
-    TOOLTIPS = [
-        ("Time", "$x ms"),
-        ("Amp", "$y")
-    ]
-    plot = figure(plot_height=250, plot_width=250, tooltips=TOOLTIPS, title="Wavelet",
-                  tools="crosshair,pan,reset,save,wheel_zoom",
-                  x_range=[np.min(x), np.max(x)], y_range=[np.min(w) - 0.1, np.max(w) + 0.1])
-    plot.line('x', 'y', source=source, line_width=3, line_alpha=0.6)
-    plot.xaxis.axis_label = "Time (ms)"
 
-    return plot
+def wavelet_item(w, duration):
+    """JSON text of the json_item of plot_wavelet(w, duration), filled into the wavelet figure serialized once"""
+    return template(_wavelet_figure).item(_values(w, duration))
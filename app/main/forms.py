@@ -94,6 +94,10 @@ class ValidateFrequency(object):
                 if not freqs[0] < freqs[1] < freqs[2] < freqs[3]:
                     msg = "Frequencies should increase in value: F1 < F2 < F3 < F4."
                     raise ValidationError
+                # the central frequency (F1 + F4) / 2 sizes the model, so it has to be at least 1 Hz
+                if (freqs[0] + freqs[3]) // 2 < 1:
+                    msg = "Central frequency (F1 + F4) / 2 should be at least 1 Hz."
+                    raise ValidationError
             except ValidationError:
                 raise ValidationError(msg)
             except AttributeError:
@@ -108,9 +112,9 @@ class ValidateFrequency(object):
                 if len(freqs) != 1:
                     msg = "Too many frequencies entered. Ricker wavelet only takes one frequency."
                     raise ValidationError
-                # check that all frequencies are positive
-                if freqs[0] < 0:
-                    msg = "Negative frequency entered. Only positive values accepted."
+                # check that the frequency is positive
+                if freqs[0] <= 0:
+                    msg = "Frequency should be at least 1 Hz. Only positive values accepted."
                     raise ValidationError
             except ValidationError:
                 raise ValidationError(msg)
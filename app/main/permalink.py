@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from decimal import Context, Decimal, DecimalException, Inexact, InvalidOperation, Overflow, Underflow
+from urllib.parse import quote
+from werkzeug.datastructures import MultiDict
+from werkzeug.routing import BaseConverter
+from . forms import TuningWedgeForm
+
+# order of the fields in a permalink, e.g.
+# vp_1=3000;rho_1=2.5;vp_2=2700;rho_2=2.3;vp_units=0;wv_type=0;freq=25;wv_len=0.2;wv_dt=0.001
+DECIMAL_FIELDS = ['vp_1', 'rho_1', 'vp_2', 'rho_2']
+FIELDS = DECIMAL_FIELDS + ['vp_units', 'wv_type', 'freq', 'wv_len', 'wv_dt']
+# wv_len and wv_dt are written in seconds but normalized to milliseconds
+SECONDS_FIELDS = ['wv_len', 'wv_dt']
+# decimal values are parsed into thousandths below this, far beyond the range of any valid input
+MAX_MILLI = 10 ** 15
+_MILLI_CONTEXT = Context(traps=[Overflow, Underflow, Inexact, InvalidOperation])
+# input form field checking each permalink field
+FORM_FIELDS = {'vp_1': 'layer_1_vp', 'rho_1': 'layer_1_dens', 'vp_2': 'layer_2_vp', 'rho_2': 'layer_2_dens',
+               'vp_units': 'vp_units', 'wv_type': 'wv_type', 'freq': 'frequency', 'wv_len': 'wv_length',
+               'wv_dt': 'wv_dt'}
+
+
+class FieldError(ValueError):
+    """Malformed value of a single field, reported against the input form field that checks it"""
+
+    def __init__(self, key, message):
+        super(FieldError, self).__init__("{}: {}".format(key, message))
+        self.field = FORM_FIELDS[key]
+        self.message = message
+
+
+def _format_milli(value):
+    """Formats an integer number of thousandths as the shortest decimal string, e.g. 2500 -> '2.5'"""
+    whole, frac = divmod(value, 1000)
+    return '{}.{:03d}'.format(whole, frac).rstrip('0').rstrip('.')
+
+
+def _parse_milli(text):
+    """Parses a non-negative decimal string with at most three decimal places into thousandths, e.g. '2.5' -> 2500"""
+    try:
+        value = Decimal(text)
+    except InvalidOperation:
+        raise ValueError("Invalid decimal value {!r}".format(text))
+    if not value.is_finite() or value < 0:
+        raise ValueError("Invalid decimal value {!r}".format(text))
+    try:
+        # exact arithmetic only, so a huge or tiny exponent is an error rather than an overflow or a rounded value
+        value = _MILLI_CONTEXT.multiply(value, 1000)
+    except DecimalException:
+        raise ValueError("Decimal value {!r} is out of range or has too many digits".format(text))
+    if value != value.to_integral_value():
+        raise ValueError("At most three decimal places are supported, got {!r}".format(text))
+    if value >= MAX_MILLI:
+        raise ValueError("Decimal value {!r} is out of range".format(text))
+    return int(value)
+
+
+def encode_params(params):
+    """Encodes normalized scenario inputs as a readable permalink path segment
+
+    Parameters
+    ----------
+    params : dict
+        normalized scenario inputs, as returned by views._session_params
+
+    Returns
+    -------
+    str
+        key=value pairs separated by semicolons, in FIELDS order
+
+    """
+    values = []
+    for key in FIELDS:
+        if key == 'freq':
+            value = ','.join(str(f) for f in params['freq'])
+        elif key in DECIMAL_FIELDS or key in SECONDS_FIELDS:
+            value = _format_milli(params[key])
+        else:
+            value = str(params[key])
+        values.append('{}={}'.format(key, value))
+    return ';'.join(values)
+
+
+def parse_fields(fields):
+    """Parses the text value of every field into normalized scenario inputs
+
+    Parameters
+    ----------
+    fields : dict
+        text value of each of FIELDS, in any equivalent notation, e.g. {'vp_1': '3000', 'rho_1': '2.50', ...}
+
+    Returns
+    -------
+    dict
+        normalized scenario inputs, as returned by views._session_params. Layer 3 takes the properties of
+        layer 1, as on the input form
+
+    Raises
+    ------
+    ValueError
+        when a field is missing or unknown, and FieldError when the value of a field is malformed
+
+    """
+    if sorted(fields) != sorted(FIELDS):
+        raise ValueError("Expected the fields {}".format(', '.join(FIELDS)))
+    params = {}
+    for key in FIELDS:
+        try:
+            if key == 'freq':
+                params[key] = [int(f) for f in fields[key].split(',')]
+            elif key in DECIMAL_FIELDS or key in SECONDS_FIELDS:
+                params[key] = _parse_milli(fields[key])
+            else:
+                params[key] = int(fields[key])
+        except ValueError as e:
+            raise FieldError(key, str(e))
+    params['vp_3'] = params['vp_1']
+    params['rho_3'] = params['rho_1']
+    return params
+
+
+def decode_params(text):
+    """Decodes a permalink path segment into normalized scenario inputs
+
+    The fields may come in any order and values in any equivalent notation, so the result should be encoded
+    again to get the canonical permalink.
+
+    Parameters
+    ----------
+    text : str
+        key=value pairs separated by semicolons
+
+    Returns
+    -------
+    dict
+        normalized scenario inputs, as returned by views._session_params
+
+    Raises
+    ------
+    ValueError
+        when a field is missing, unknown, repeated or malformed
+
+    """
+    pairs = [item.partition('=') for item in text.split(';')]
+    fields = {key: value for key, sep, value in pairs if sep}
+    if len(fields) != len(pairs):
+        raise ValueError("Expected the fields {}".format(', '.join(FIELDS)))
+    return parse_fields(fields)
+
+
+def validation_errors(params):
+    """Checks normalized scenario inputs with the same validators as the input form
+
+    Parameters
+    ----------
+    params : dict
+        normalized scenario inputs returned by parse_fields or decode_params
+
+    Returns
+    -------
+    dict
+        error messages of each invalid form field, empty when the inputs are valid
+
+    """
+    data = MultiDict({
+        'layer_1_vp': params['vp_1'] / 1000, 'layer_1_dens': params['rho_1'] / 1000,
+        'layer_1_impedance': params['vp_1'] * params['rho_1'] // 1000000,
+        'layer_2_vp': params['vp_2'] / 1000, 'layer_2_dens': params['rho_2'] / 1000,
+        'layer_2_impedance': params['vp_2'] * params['rho_2'] // 1000000,
+        'vp_units': params['vp_units'], 'wv_type': params['wv_type'],
+        'frequency': ','.join(str(f) for f in params['freq']),
+        'wv_length': params['wv_len'] / 1000, 'wv_dt': params['wv_dt'] / 1000
+    })
+    form = TuningWedgeForm(formdata=data, meta={'csrf': False})
+    form.validate()
+    errors = dict(form.errors)
+    # velocities are entered as whole numbers on the form
+    for key in ['vp_1', 'vp_2']:
+        if params[key] % 1000:
+            errors.setdefault(FORM_FIELDS[key], []).append('Not a valid integer value')
+    return errors
+
+
+class ParamsConverter(BaseConverter):
+    """URL converter that keeps the separators of a permalink readable instead of percent-encoding them"""
+
+    def to_url(self, value):
+        return quote(str(value), safe=';=,')
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from flask import current_app
+
+from .. import results_pipeline, wedge_store
+
+# numpy and bokeh are imported by the stages that use them, so that creating the app imports neither
+
+# the stages of the /results page read the normalized inputs returned by views._session_params, in which decimal
+# values are stored as integers (value * 1000)
+ROCK_PROPS = ['vp_1', 'rho_1', 'vp_2', 'rho_2', 'vp_3', 'rho_3']
+
+
+def _image_options():
+    """encoding and levels of the plot images, from the IMAGE_ENCODING and IMAGE_LEVELS config"""
+    return dict(encoding=current_app.config.get('IMAGE_ENCODING', 'float64'),
+                levels=current_app.config.get('IMAGE_LEVELS', 0))
+
+
+@results_pipeline.stage('rock_props', inputs=ROCK_PROPS, by_value=True)
+def rock_props(vp_1, rho_1, vp_2, rho_2, vp_3, rho_3):
+    """Vp and density of each layer, as expected by wedgebuilder"""
+    return [value / 1000 for value in [vp_1, rho_1, vp_2, rho_2, vp_3, rho_3]]
+
+
+@results_pipeline.stage('wavelet', inputs=['wv_len', 'wv_dt', 'wv_type', 'freq'])
+def wavelet(wv_len, wv_dt, wv_type, freq):
+    """WaveletEntry holding the wavelet, its spectrum and its central frequency"""
+    from . import wedgebuilder as wb
+    return wb.cached_wavelet(wv_len / 1000, wv_dt / 1000, wv_type, freq)
+
+
+@results_pipeline.stage('geometry', inputs=['wv_dt'], deps=['wavelet'], by_value=True)
+def geometry(wv_dt, wavelet):
+    """(width, height) of the model, widened for low frequency wavelets"""
+    from . import wedgebuilder as wb
+    return wb.get_model_geometry(wavelet.f_central, wv_dt / 1000)
+
+
+@results_pipeline.stage('earth', deps=['rock_props', 'geometry'])
+def earth(rock_props, geometry):
+    """(height, width) array of layer impedance"""
+    from . import wedgebuilder as wb
+    width, height = geometry
+    return wb.earth_model(rock_props, width, height)[1]
+
+
+@results_pipeline.stage('analysis', inputs=['wv_dt'], deps=['rock_props', 'wavelet', 'geometry'])
+def analysis(wv_dt, rock_props, wavelet, geometry):
+    """WedgeAnalysis of the scenario, with the synthetic and the measurements computed"""
+    from . import wedgebuilder as wb
+    width, height = geometry
+    result = wb.WedgeAnalysis(rock_props, wavelet.w, wv_dt / 1000, wavelet.f_central, width, height,
+                              store=wedge_store)
+    # evaluate the lazy attributes the plots read now, so a cached analysis is never mutated across requests
+    for attribute in ['synth', 't', 'wt', 'z', 'amp', 'z_apparent', 'tuning_thickness', 'onset_thickness']:
+        getattr(result, attribute)
+    return result
+
+
+@results_pipeline.stage('wavelet_plot', inputs=['wv_len'], deps=['wavelet'])
+def wavelet_plot(wv_len, wavelet):
+    """json_item of the wavelet plot"""
+    from . import bokeh_wavelet as bwv
+    return bwv.wavelet_item(wavelet.w, wv_len / 1000)
+
+
+@results_pipeline.stage('spectrum_plots', inputs=['wv_dt'], deps=['wavelet'])
+def spectrum_plots(wv_dt, wavelet):
+    """json_item of the amplitude spectrum and of the phase plot"""
+    from . import bokeh_amplitude_spectrum as bas
+    return bas.amplitude_spectrum_items(wavelet.w, wv_dt / 1000, wavelet.spectrum, wavelet.freqs)
+
+
+@results_pipeline.stage('earth_plot', inputs=['wv_dt'], deps=['earth'])
+def earth_plot(wv_dt, earth):
+    """json_item of the earth model plot"""
+    from . import wedgebuilder as wb
+    from . import bokeh_plot_wedge as bwg
+    dt = wv_dt / 1000
+    height, width = earth.shape
+    return bwg.earth_model_item(earth, dt, t=wb._thickness_axis(height, dt), wt=wb._wedge_thickness_axis(width, dt),
+                                **_image_options())
+
+
+@results_pipeline.stage('synth_plot', inputs=['wv_dt'], deps=['analysis'])
+def synth_plot(wv_dt, analysis):
+    """json_item of the synthetic wedge plot"""
+    from . import bokeh_plot_wedge as bwg
+    return bwg.synth_item(analysis.synth, wv_dt / 1000, analysis.tuning_thickness, analysis.onset_thickness,
+                          t=analysis.t, wt=analysis.wt, **_image_options())
+
+
+@results_pipeline.stage('tuning_curve_plot', deps=['analysis'])
+def tuning_curve_plot(analysis):
+    """json_item of the tuning curve plot"""
+    from . import bokeh_tuning_curve as btc
+    return btc.tuning_curve_item(analysis.z, analysis.amp, analysis.z_apparent, analysis.tuning_thickness,
+                                 analysis.onset_thickness)
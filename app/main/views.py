@@ -16,17 +16,19 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-from flask import render_template, redirect, url_for, request, session, current_app
+from collections import OrderedDict
+from importlib import metadata
+
+from flask import render_template, redirect, url_for, request, session, current_app, make_response, abort
 from . import main
+from .. import __version__, results_cache, results_pipeline, single_flight
+from .. cache import fingerprint
 from .. email import send_email
 from . forms import ContactForm, TuningWedgeForm
-from . import wedgebuilder as wb
-from . import bokeh_wavelet as bwv
-from . import bokeh_amplitude_spectrum as bas
-from . import bokeh_plot_wedge as bwg
-from . import bokeh_tuning_curve as btc
-from bokeh.embed import components
-from bokeh.models import Panel, Tabs
+from . permalink import decode_params, encode_params, validation_errors
+
+# the pages embed BokehJS URLs and plot JSON of the installed bokeh, read without importing it
+_BOKEH_VERSION = metadata.version('bokeh')
 
 
 @main.route('/', methods=['GET', 'POST'])
@@ -53,79 +55,179 @@ def index():
         session['freq'] = form.frequency.data
         session['wv_len'] = int(form.wv_length.data * 1000)
         session['wv_dt'] = int(form.wv_dt.data * 1000)
-        return redirect(url_for('.results'))
+        # the session still fills in the form on the next visit, but the results live at a stateless permalink
+        return redirect(url_for('.permalink', params=encode_params(_session_params())))
     return render_template('index.html', form=form)
 
 
-@main.route('/results')
-def results():
-    # assign values from TuningWedgeForm, dividing decimal values by 1000 to recover input value
-    layer_1_vp = session.get('vp_1') / 1000
-    layer_1_dens = session.get('rho_1') / 1000
-    layer_2_vp = session.get('vp_2') / 1000
-    layer_2_dens = session.get('rho_2') / 1000
-    layer_3_vp = session.get('vp_3') / 1000
-    layer_3_dens = session.get('rho_3') / 1000
-    vp_units = session.get('vp_units')
-    wv_type = session.get('wv_type')
+def _session_params():
+    """Collects the scenario inputs stored in the session into a normalized dictionary
+
+    Decimal inputs are kept as the integers (value * 1000) stored in the session and the frequency string is
+    split into a list of int, so equivalent inputs always produce the same dictionary.
+
+    Returns
+    -------
+    dict
+
+    """
+    params = {key: session.get(key) for key in ['vp_1', 'rho_1', 'vp_2', 'rho_2', 'vp_3', 'rho_3', 'vp_units',
+                                                 'wv_type', 'wv_len', 'wv_dt']}
     # depending on whether a Ricker or Ormsby wavelet is requested, we may have more than one value
     # split the input string by comma and then typecast to int
-    freq_str = session.get('freq')
-    freq = [int(x) for x in freq_str.split(',')]
-    wv_len = float(session.get('wv_len')) / 1000
-    wv_dt = float(session.get('wv_dt')) / 1000
-
-    # create the tuning wedge model, theoretical tuning parameters, & tuning curve
-    rock_props = [layer_1_vp, layer_1_dens, layer_2_vp, layer_2_dens, layer_3_vp, layer_3_dens]
-    acoustic_impedance = wb.impedance_model(rock_props)
-    rc, imp = wb.earth_model(rock_props)
-    wavelet = wb.wavelet(wv_len, wv_dt, wv_type, freq)
-    f_central = wb.get_central_frequency(wv_type, freq)
-    tuning_onset = wb.get_theoretical_onset_tuning_thickness(f_central)
-    tuning = wb.get_theoretical_tuning_thickness(f_central)
-    resolution_limit = wb.get_theoretical_resolution_limit(f_central)
-    synth = wb.tuning_wedge(rc, wavelet)
-    z = wb.get_wedge_thickness(synth, wv_dt)
-    z_apparent = wb.get_apparent_wedge_thickness(synth, wv_dt, acoustic_impedance)
-    tuning_meas = wb.get_measured_tuning_thickness(synth, wv_dt, acoustic_impedance)
-    onset_meas = wb.get_measured_onset_tuning_thickness(z, z_apparent, f_central)
-    amp = wb.get_tuning_curve_amplitude(acoustic_impedance, synth)
-
-    # build wavelet plot and create bokeh script and div
-    wavelet_plot = bwv.plot_wavelet(wavelet, wv_len)
-    wv_script, wv_div = components(wavelet_plot)
-
-    # build amplitude spectrum & phase plots and create script & div
-    amplitude_spectrum, phase_plot = bas.plot_amplitude_spectrum(wavelet, wv_dt)
-    ampspec_script, ampspec_div = components(amplitude_spectrum)
-    phase_script, phase_div = components(phase_plot)
-
-    # Get the synthetic wedge and earth model plots
-    earth_mod = bwg.plot_earth_model(imp, wv_dt)
-    synth_mod = bwg.plot_synth(synth, wv_dt, tuning_meas, onset_meas)
-
-    # put the synthetic wedge and earth model plots together in a tabbed panel
-    tab1 = Panel(child=synth_mod, title="Synthetic Wedge")
-    tab2 = Panel(child=earth_mod, title="Earth Model")
-    wedge_script, wedge_div = components(Tabs(tabs=[tab1, tab2]))
-
-    # build the tuning curve plot and get script and div
-    tuning_curve = btc.plot_tuning_curve(z, amp, z_apparent, tuning_meas, onset_meas)
-    tc_script, tc_div = components(tuning_curve)
-    return render_template('results.html',
-                           vp_1=layer_1_vp, rho_1=layer_1_dens,
-                           vp_2=layer_2_vp, rho_2=layer_2_dens,
-                           vp_units=vp_units, wv_type=wv_type,
-                           freq=freq, wv_len=wv_len, wv_dt=wv_dt,
-                           wv_div=wv_div, wv_script=wv_script,
-                           ampspec_div=ampspec_div, ampspec_script=ampspec_script,
-                           phase_script=phase_script, phase_div=phase_div,
-                           wedge_script=wedge_script, wedge_div=wedge_div,
-                           tc_script=tc_script, tc_div=tc_div,
-                           tuning_twt=tuning, tuning_twt_onset=tuning_onset,
-                           tuning_twt_meas=tuning_meas, tuning_twt_onset_meas=onset_meas,
-                           res_lim=resolution_limit
-                           )
+    params['freq'] = [int(x) for x in session.get('freq').split(',')]
+    return params
+
+
+# plots of the results page by the name used in their URL, with the pipeline stage that builds each one and, for
+# stages that build several figures, the position of the figure in the stage output
+PLOTS = OrderedDict([
+    ('wavelet', ('wavelet_plot', None)),
+    ('spectrum', ('spectrum_plots', 0)),
+    ('phase', ('spectrum_plots', 1)),
+    ('synth', ('synth_plot', None)),
+    ('earth', ('earth_plot', None)),
+    ('tuning_curve', ('tuning_curve_plot', None)),
+])
+
+
+def _results_context(params):
+    """Builds the model and measurements for the results page
+
+    The page is only a skeleton with the numeric summary. Every plot is fetched by results_scripts.js from its own
+    endpoint, so the page never waits for Bokeh figures to be built. The values come from stages of
+    results_pipeline, so a stage is only recomputed when one of its own inputs changed.
+
+    Parameters
+    ----------
+    params : dict
+        normalized scenario inputs returned by _session_params
+
+    Returns
+    -------
+    dict
+        template context of results.html
+
+    """
+    from . import wedgebuilder as wb
+    stages = results_pipeline.run(params, ['rock_props', 'wavelet', 'analysis'])
+    layer_1_vp, layer_1_dens, layer_2_vp, layer_2_dens = stages['rock_props'][:4]
+    f_central = stages['wavelet'].f_central
+    analysis = stages['analysis']
+    permalink_params = encode_params(params)
+    plot_urls = {name: url_for('.plot', params=permalink_params, name=name) for name in PLOTS}
+    return dict(vp_1=layer_1_vp, rho_1=layer_1_dens,
+                vp_2=layer_2_vp, rho_2=layer_2_dens,
+                vp_units=params['vp_units'], wv_type=params['wv_type'],
+                freq=params['freq'], wv_len=float(params['wv_len']) / 1000, wv_dt=float(params['wv_dt']) / 1000,
+                plot_urls=plot_urls,
+                tuning_twt=wb.get_theoretical_tuning_thickness(f_central),
+                tuning_twt_onset=wb.get_theoretical_onset_tuning_thickness(f_central),
+                tuning_twt_meas=analysis.tuning_thickness, tuning_twt_onset_meas=analysis.onset_thickness,
+                res_lim=wb.get_theoretical_resolution_limit(f_central))
+
+
+def plot_item(params, name):
+    """Returns the JSON text of the json_item of one plot of the results page, name one of PLOTS"""
+    stage, index = PLOTS[name]
+    item = results_pipeline.run(params, [stage])[stage]
+    return item if index is None else item[index]
+
+
+def _render_plot(params, name):
+    """Returns the json_item of one plot of the results page as a JSON response"""
+    return current_app.response_class(plot_item(params, name), mimetype='application/json')
+
+
+def _render_results(params):
+    """Renders the results page of a scenario, computing it at most once across concurrent identical requests
+
+    Parameters
+    ----------
+    params : dict
+        normalized scenario inputs returned by _session_params or decode_params
+
+    Returns
+    -------
+    flask.Response
+        with an X-Cache header of HIT, MISS or COALESCED
+
+    """
+    # a refresh or a back-button visit with the same inputs is served from the results cache without recomputing
+    key = fingerprint(params)
+    context = results_cache.get(key)
+    status = 'HIT'
+    if context is None:
+        # identical requests arriving together share one computation
+        def compute():
+            computed = _results_context(params)
+            results_cache.set(key, computed)
+            return computed
+        context, shared = single_flight.do(key, compute, lookup=lambda: results_cache.peek(key))
+        status = 'COALESCED' if shared else 'MISS'
+    response = make_response(render_template('results.html', **context))
+    response.headers['X-Cache'] = status
+    return response
+
+
+@main.route('/results')
+def results():
+    # kept for old links and bookmarks, renders the scenario stored in the session
+    return _render_results(_session_params())
+
+
+def _cacheable(params, render, endpoint, **kwargs):
+    """Serves a response that depends on the permalink inputs alone, with a strong ETag and long-lived caching
+
+    Parameters
+    ----------
+    params : str
+        permalink path segment
+    render : callable
+        called with the normalized scenario inputs, returns the response
+    endpoint : str
+        endpoint the canonical URL is built for
+    kwargs : dict
+        other URL values of the endpoint, also part of the ETag
+
+    Returns
+    -------
+    flask.Response
+
+    """
+    # the response never reads the session, so browsers and proxies may cache it
+    try:
+        scenario = decode_params(params)
+    except ValueError:
+        abort(404)
+    canonical = encode_params(scenario)
+    if params != canonical:
+        return redirect(url_for(endpoint, params=canonical, **kwargs), code=301)
+    if validation_errors(scenario):
+        abort(404)
+    # a new release or bokeh upgrade may change the response, so both versions are part of the validator
+    etag = fingerprint(dict(kwargs, params=scenario, version=__version__, bokeh=_BOKEH_VERSION))
+    # compressed responses carry the weak form of the etag, which still validates the same content
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = render(scenario)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['RESULTS_MAX_AGE']
+    return response
+
+
+@main.route('/results/<params:params>')
+def permalink(params):
+    return _cacheable(params, _render_results, '.permalink')
+
+
+@main.route('/results/<params:params>/plots/<name>')
+def plot(params, name):
+    if name not in PLOTS:
+        abort(404)
+    return _cacheable(params, lambda scenario: _render_plot(scenario, name), '.plot', name=name)
 
 
 @main.route('/about')
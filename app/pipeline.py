@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+
+from .cache import ResultsCache, fingerprint
+
+Stage = collections.namedtuple('Stage', ['name', 'func', 'inputs', 'deps', 'by_value'])
+
+
+class Pipeline(object):
+    """Small dependency graph of named stages, each with its own content-keyed cache
+
+    A stage is a function registered with the stage decorator. It is called with keyword arguments named after
+    the scenario inputs and the upstream stages it declares, and its output is cached under the fingerprint of
+    those inputs and of the keys of its upstream stages. A stage is therefore recomputed only when something it
+    actually depends on changes, e.g. a new frequency leaves the cached earth model untouched.
+
+    By default a stage's key is passed downstream, so a stage is invalidated whenever any upstream input changes.
+    A stage registered with by_value=True passes its (JSON serializable) output downstream instead, so dependents
+    are reused whenever it produces the same value from different inputs.
+
+    Stage outputs are often requested by several requests at once, e.g. every plot of a new scenario reads the
+    same analysis. When flight is given, identical stage computations are coalesced through it, so each runs once.
+
+    Follows the flask extension pattern: init_app reads PIPELINE_CACHE_SIZE (the maximum number of entries of each
+    stage, 0 disables caching) and RESULTS_CACHE_TTL from the app config.
+
+    """
+
+    def __init__(self, app=None, maxsize=32, ttl=3600, flight=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.flight = flight
+        self.stages = collections.OrderedDict()
+        self._caches = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('PIPELINE_CACHE_SIZE', self.maxsize)
+        self.ttl = app.config.get('RESULTS_CACHE_TTL', self.ttl)
+        for cache in self._caches.values():
+            cache.maxsize = self.maxsize
+            cache.ttl = self.ttl
+            cache.clear()
+        app.extensions['pipeline'] = self
+
+    def stage(self, name, inputs=(), deps=(), by_value=False):
+        """Decorator registering a function as a named stage
+
+        Parameters
+        ----------
+        name : str
+            stage name, also the keyword under which its output is passed to dependent stages
+        inputs : sequence of str
+            names of the scenario inputs the stage reads
+        deps : sequence of str
+            names of previously registered stages the stage reads
+        by_value : bool
+            pass the output, rather than the stage key, to the keys of dependent stages
+
+        Returns
+        -------
+        callable
+
+        """
+        unknown = [dep for dep in deps if dep not in self.stages]
+        if unknown:
+            raise ValueError("Stage {!r} depends on unknown stages {}".format(name, unknown))
+
+        def decorator(func):
+            self.stages[name] = Stage(name, func, tuple(inputs), tuple(deps), by_value)
+            self._caches[name] = ResultsCache(maxsize=self.maxsize, ttl=self.ttl)
+            return func
+        return decorator
+
+    def run(self, params, targets=None):
+        """Evaluates the target stages and everything upstream of them, reusing cached outputs
+
+        Parameters
+        ----------
+        params : dict
+            scenario inputs read by the stages, JSON serializable
+        targets : sequence of str
+            names of the stages to evaluate. Defaults to every stage
+
+        Returns
+        -------
+        dict
+            output of every evaluated stage, by name
+
+        """
+        values = {}
+        tokens = {}
+        for name in (self.stages if targets is None else targets):
+            self._resolve(name, params, values, tokens)
+        return values
+
+    def _resolve(self, name, params, values, tokens):
+        if name in values:
+            return
+        stage = self.stages[name]
+        for dep in stage.deps:
+            self._resolve(dep, params, values, tokens)
+        inputs = {key: params[key] for key in stage.inputs}
+        key = fingerprint({'stage': name, 'inputs': inputs, 'deps': {dep: tokens[dep] for dep in stage.deps}})
+        cache = self._caches[name]
+        value = cache.get(key)
+        if value is None:
+            inputs.update((dep, values[dep]) for dep in stage.deps)
+
+            def compute():
+                computed = stage.func(**inputs)
+                cache.set(key, computed)
+                return computed
+            if self.flight is None:
+                value = compute()
+            else:
+                value, shared = self.flight.do(key, compute, lookup=lambda: cache.peek(key))
+        values[name] = value
+        tokens[name] = value if stage.by_value else key
+
+    def info(self):
+        """Returns the cache statistics of every stage
+
+        Returns
+        -------
+        dict
+            CacheInfo of each stage, by name
+
+        """
+        return collections.OrderedDict((name, self._caches[name].info()) for name in self.stages)
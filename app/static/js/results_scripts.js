@@ -15,9 +15,29 @@ See the License for the specific language governing permissions and
 limitations under the License.
 */
 
-// Defines a timeout so that page content will not load until after Bokeh plots do
-// and hides bootstrap spinner upon load
-setTimeout(function() {
-    $("#divDelay").show();
-    $("#spinner").hide()
-}, 2000);
+// Fetches every plot of the page from its own endpoint and embeds it as soon as it arrives, so the page and its
+// numeric summary show right away and no plot waits for a slower one
+$(function() {
+    $("[data-plot-url]").each(function() {
+        var target = this;
+        fetch(target.dataset.plotUrl)
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.json();
+            })
+            .then(function(item) {
+                $(target).empty();
+                Bokeh.embed.embed_item(item, target.id);
+            })
+            .catch(function() {
+                $(target).html("<p class=\"text-danger\">The plot could not be loaded.</p>");
+            });
+    });
+});
+
+// Bokeh lays out plots in a hidden tab with zero size, so lay them out again once their tab is shown
+$(document).on("shown.bs.tab", "a[data-toggle=\"tab\"]", function() {
+    window.dispatchEvent(new Event("resize"));
+});
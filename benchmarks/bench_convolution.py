@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+# Compares wedgebuilder.convolve_same with convolving the traces of a model one by one with np.convolve, over model
+# widths and wavelet lengths. Run from the repository root:
+#
+#   $ python -m benchmarks.bench_convolution
+#   $ python -m benchmarks.bench_convolution --height 1000 --durations 0.2 1.0
+
+import argparse
+import timeit
+import numpy as np
+from app.main import wedgebuilder as wb
+
+
+def column_convolution(rc, w):
+    """The per-trace loop convolve_same replaces"""
+    return np.stack([np.convolve(rc[:, i], w, mode="same") for i in range(rc.shape[1])], axis=1)
+
+
+def best_time(func, *args, repeat=5):
+    """Returns the best time of func(*args) in milliseconds"""
+    number = 5
+    return min(timeit.repeat(lambda: func(*args), number=number, repeat=repeat)) / number * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--height', type=int, default=240)
+    parser.add_argument('--widths', type=int, nargs='+', default=[101, 404, 1616])
+    parser.add_argument('--durations', type=float, nargs='+', default=[0.1, 0.2, 0.5, 1.0])
+    parser.add_argument('--dt', type=float, default=0.001)
+    args = parser.parse_args()
+
+    rock_props = [3000, 2.5, 2700, 2.3, 3000, 2.5]
+    print('{:>8}{:>10}{:>8}{:>16}{:>12}{:>9}'.format('width', 'wavelet', 'path', 'convolve_same', 'per trace',
+                                                   'speedup'))
+    for duration in args.durations:
+        w = wb.wavelet(duration, args.dt, w_type=0, f=[30])
+        path = 'matrix' if wb._use_matrix_convolution(args.height, w.size) else 'fft'
+        for width in args.widths:
+            rc, _ = wb.earth_model(rock_props, width, args.height)
+            batched = best_time(wb.convolve_same, rc, w)
+            looped = best_time(column_convolution, rc, w)
+            print('{:>8}{:>8.1f} s{:>8}{:>13.2f} ms{:>9.2f} ms{:>8.1f}x'.format(width, duration, path, batched, looped,
+                                                                          looped / batched))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+# Reports the peak memory allocated by each stage of the wedgebuilder pipeline in double and single precision.
+# Run from the repository root:
+#
+#   $ python -m benchmarks.bench_memory
+#   $ python -m benchmarks.bench_memory --width 1001 --height 2400 --duration 1.0
+
+import argparse
+import tracemalloc
+import numpy as np
+from app.main import wedgebuilder as wb
+
+
+def peak_allocation(func, *args, **kwargs):
+    """Runs func and returns its result together with the peak number of bytes allocated while it ran"""
+    tracemalloc.start()
+    try:
+        result = func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def measurements(synth, dt, acoustic_impedance, f_central):
+    z = wb.get_wedge_thickness(synth, dt)
+    z_apparent = wb.get_apparent_wedge_thickness(synth, dt, acoustic_impedance)
+    tuning = wb.get_measured_tuning_thickness(synth, dt, acoustic_impedance)
+    onset = wb.get_measured_onset_tuning_thickness(z, z_apparent, f_central)
+    amp = wb.get_tuning_curve_amplitude(acoustic_impedance, synth)
+    return tuning, onset, amp
+
+
+def run(rock_props, width, height, duration, dt, w_type, f, dtype):
+    f_central = wb.get_central_frequency(w_type, f)
+    acoustic_impedance = wb.impedance_model(rock_props)
+    stages = []
+    w, peak = peak_allocation(wb.wavelet, duration, dt, w_type, f, dtype=dtype)
+    stages.append(('wavelet', peak))
+    (rc, imp), peak = peak_allocation(wb.earth_model, rock_props, width, height, dtype=dtype)
+    stages.append(('earth_model', peak))
+    synth, peak = peak_allocation(wb.tuning_wedge, rc, w)
+    stages.append(('tuning_wedge', peak))
+    (tuning, onset, _), peak = peak_allocation(measurements, synth, dt, acoustic_impedance, f_central)
+    stages.append(('measurements', peak))
+    return stages, tuning, onset
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--width', type=int, default=101)
+    parser.add_argument('--height', type=int, default=240)
+    parser.add_argument('--duration', type=float, default=0.100)
+    parser.add_argument('--dt', type=float, default=0.001)
+    parser.add_argument('--frequency', type=int, default=30)
+    args = parser.parse_args()
+
+    rock_props = [3000, 2.5, 2700, 2.3, 3000, 2.5]
+    results = {}
+    for dtype in [np.float64, np.float32]:
+        results[dtype] = run(rock_props, args.width, args.height, args.duration, args.dt, 0, [args.frequency], dtype)
+
+    print('model {} x {}, wavelet {} s at dt = {} s'.format(args.height, args.width, args.duration, args.dt))
+    print('{:<14}{:>14}{:>14}{:>8}'.format('stage', 'float64 (KiB)', 'float32 (KiB)', 'ratio'))
+    for (name, peak_64), (_, peak_32) in zip(results[np.float64][0], results[np.float32][0]):
+        print('{:<14}{:>14.1f}{:>14.1f}{:>8.2f}'.format(name, peak_64 / 1024, peak_32 / 1024, peak_32 / peak_64))
+    for dtype in [np.float64, np.float32]:
+        _, tuning, onset = results[dtype]
+        print('{:<8} measured tuning {:.1f} ms, onset {} ms'.format(np.dtype(dtype).name, tuning, onset))
+
+
+if __name__ == '__main__':
+    main()
@@ -32,6 +32,39 @@ class Config:
     RECAPTCHA_PUBLIC_KEY = os.environ.get('RECAPTCHA_PUBLIC_KEY')
     RECAPTCHA_PRIVATE_KEY = os.environ.get('RECAPTCHA_PRIVATE_KEY')
     RECAPTCHA_OPTIONS = os.environ.get('RECAPTCHA_OPTIONS')
+    # rendered /results components are cached per scenario, RESULTS_CACHE_SIZE = 0 disables the cache
+    RESULTS_CACHE_SIZE = int(os.environ.get('RESULTS_CACHE_SIZE', 128))
+    RESULTS_CACHE_TTL = int(os.environ.get('RESULTS_CACHE_TTL', 3600))
+    # computed wedge arrays are kept on disk and shared across workers when WEDGE_CACHE_DIR is set
+    WEDGE_CACHE_DIR = os.environ.get('WEDGE_CACHE_DIR')
+    WEDGE_CACHE_MAX_BYTES = int(os.environ.get('WEDGE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+    # identical concurrent /results computations also coalesce across worker processes when this is set
+    SINGLE_FLIGHT_LOCK_DIR = os.environ.get('SINGLE_FLIGHT_LOCK_DIR')
+    # each stage of the /results pipeline (wavelet, earth model, synthetic, plots) caches this many outputs
+    PIPELINE_CACHE_SIZE = int(os.environ.get('PIPELINE_CACHE_SIZE', 32))
+    # browsers and proxies may reuse a /results/<params> permalink page for this many seconds
+    RESULTS_MAX_AGE = int(os.environ.get('RESULTS_MAX_AGE', 30 * 24 * 3600))
+    # largest number of scenarios accepted by one /api/v1/wedge/batch request
+    API_BATCH_MAX = int(os.environ.get('API_BATCH_MAX', 1000))
+    # html, json, css and js responses of at least COMPRESS_MIN_SIZE bytes are sent brotli (when the brotli
+    # package is installed) or gzip compressed to clients that accept it
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() in ['true', 'on', '1']
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_BR_LEVEL = int(os.environ.get('COMPRESS_BR_LEVEL', 5))
+    # write the .br / .gz siblings of static files at startup, `flask compress-static` does it ahead of time
+    COMPRESS_STATIC = os.environ.get('COMPRESS_STATIC') is not None
+    # BokehJS, jQuery, Popper and Bootstrap are loaded from public CDNs ('cdn'), served by the app ('local') or
+    # embedded in each page ('inline'). The vendored libraries are not checked in, run `flask vendor-assets` once
+    # before switching to 'local' or 'inline', e.g. for an air-gapped deployment
+    ASSETS_MODE = os.environ.get('ASSETS_MODE', 'cdn')
+    # how the earth model and synthetic plot images are sent: 'uint8' levels colour mapped in the browser, 'rgba'
+    # colours, 'float32' or 'float64' values. IMAGE_LEVELS is the number of uint8 levels, 0 for the size of the palette
+    IMAGE_ENCODING = os.environ.get('IMAGE_ENCODING', 'uint8')
+    IMAGE_LEVELS = int(os.environ.get('IMAGE_LEVELS', 0))
+    # milliseconds that importing the app and create_app may take in a fresh interpreter, checked by
+    # `flask import-time`; numpy and bokeh are imported on first use and are not part of it
+    IMPORT_TIME_BUDGET_MS = int(os.environ.get('IMPORT_TIME_BUDGET_MS', 300))
 
     @staticmethod
     def init_app(app):
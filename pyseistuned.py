@@ -61,3 +61,104 @@ def test(coverage):
         COV.html_report(directory=covdir)
         print('HTML report: file://%s/index.html' % covdir)
         COV.erase()
+
+
+@app.cli.command('compress-static')
+def compress_static():
+    """Write precompressed .br / .gz siblings of the static files"""
+    from app import compress
+    for path, encoding, original, compressed in compress.precompress_static(app):
+        print('{} ({}): {} -> {} bytes'.format(os.path.relpath(path), encoding, original, compressed))
+
+
+@app.cli.command('vendor-assets')
+def vendor_assets():
+    """Download jQuery, Popper and Bootstrap into app/static/vendor, checking their integrity hashes"""
+    from app import assets
+    for path in assets.vendor(app):
+        print('{}: {} bytes'.format(os.path.relpath(path), os.path.getsize(path)))
+
+
+@app.cli.command('import-time')
+@click.option('--top', default=15, help='Number of packages to list')
+def import_time(top):
+    """Report which packages dominate the import time of create_app"""
+    from app.importtime import DEFERRED_PACKAGES, by_package, measure_import_time
+    times = measure_import_time(os.getenv('FLASK_CONFIG') or 'default')
+    packages = by_package(times)
+    for package, us in packages[:top]:
+        print('{:9.1f} ms  {}'.format(us / 1000, package))
+    total = sum(us for package, us in packages) / 1000
+    budget = app.config['IMPORT_TIME_BUDGET_MS']
+    print('{:9.1f} ms  total, budget {} ms'.format(total, budget))
+    deferred = sorted(set(DEFERRED_PACKAGES) & set(package for package, us in packages))
+    if deferred:
+        print('create_app imports {}, which should only be imported on first use'.format(', '.join(deferred)))
+    if total > budget or deferred:
+        sys.exit(1)
+
+
+# /results/<params> permalink segment of the scenario the plot commands report on by default
+DEFAULT_PARAMS = 'vp_1=3000;rho_1=2.5;vp_2=2700;rho_2=2.3;vp_units=0;wv_type=0;freq=25;wv_len=0.2;wv_dt=0.001'
+
+
+@app.cli.command('plot-sizes')
+@click.argument('params', default=DEFAULT_PARAMS)
+@click.option('--columns', default=3, help='Number of the largest data source columns to list per plot')
+def plot_sizes(params, columns):
+    """Report the size of every plot of the results page of PARAMS, a /results/<params> permalink segment"""
+    from app.main.bokeh_sources import plot_size
+    from app.main.permalink import decode_params
+    from app.main.views import PLOTS, plot_item
+    scenario = decode_params(params)
+    total = 0
+    for name in PLOTS:
+        size = plot_size(plot_item(scenario, name))
+        total += size.gzip_bytes
+        print('{:14} {:9} bytes  {:8} gzip  {:9} data'.format(name, size.bytes, size.gzip_bytes, size.data_bytes))
+        for column in size.columns[:columns]:
+            print('{:16} {:9} bytes  column {} of source {}'.format('', column.bytes, column.column, column.source))
+    print('{:14} {:9} gzip bytes in all'.format('total', total))
+
+
+@app.cli.command('plot-benchmark')
+@click.argument('params', default=DEFAULT_PARAMS)
+@click.option('--repeat', default=20, help='Number of builds timed per plot')
+def plot_benchmark(params, repeat):
+    """Compare building every plot of PARAMS from scratch with filling its prebuilt figure template"""
+    import json
+    import timeit
+    from bokeh.embed import json_item
+    from app import results_pipeline
+    from app.main import bokeh_amplitude_spectrum as bas
+    from app.main import bokeh_plot_wedge as bwg
+    from app.main import bokeh_tuning_curve as btc
+    from app.main import bokeh_wavelet as bwv
+    from app.main.permalink import decode_params
+    scenario = decode_params(params)
+    stages = results_pipeline.run(scenario, ['wavelet', 'analysis', 'earth'])
+    wavelet, analysis, earth = stages['wavelet'], stages['analysis'], stages['earth']
+    dt = scenario['wv_dt'] / 1000
+    image = dict(encoding=app.config['IMAGE_ENCODING'], levels=app.config['IMAGE_LEVELS'])
+    synth_args = (analysis.synth, dt, analysis.tuning_thickness, analysis.onset_thickness)
+    curve_args = (analysis.z, analysis.amp, analysis.z_apparent, analysis.tuning_thickness, analysis.onset_thickness)
+    plots = [
+        ('wavelet', lambda: bwv.plot_wavelet(wavelet.w, scenario['wv_len'] / 1000),
+         lambda: bwv.wavelet_item(wavelet.w, scenario['wv_len'] / 1000)),
+        ('spectrum+phase', lambda: bas.plot_amplitude_spectrum(wavelet.w, dt, wavelet.spectrum, wavelet.freqs),
+         lambda: bas.amplitude_spectrum_items(wavelet.w, dt, wavelet.spectrum, wavelet.freqs)),
+        ('synth', lambda: bwg.plot_synth(*synth_args, t=analysis.t, wt=analysis.wt, **image),
+         lambda: bwg.synth_item(*synth_args, t=analysis.t, wt=analysis.wt, **image)),
+        ('earth', lambda: bwg.plot_earth_model(earth, dt, t=analysis.t_earth, wt=analysis.wt, **image),
+         lambda: bwg.earth_model_item(earth, dt, t=analysis.t_earth, wt=analysis.wt, **image)),
+        ('tuning_curve', lambda: btc.plot_tuning_curve(*curve_args), lambda: btc.tuning_curve_item(*curve_args)),
+    ]
+    print('{:14} {:>10} {:>10} {:>8}'.format('plot', 'cold ms', 'templ. ms', 'speedup'))
+    for name, cold, templated in plots:
+        def serialize():
+            built = cold()
+            return [json.dumps(json_item(plot)) for plot in (built if isinstance(built, tuple) else (built,))]
+        templated()  # the template is serialized once per process, on first use
+        cold_ms = timeit.timeit(serialize, number=repeat) / repeat * 1000
+        templated_ms = timeit.timeit(templated, number=repeat) / repeat * 1000
+        print('{:14} {:10.2f} {:10.2f} {:7.1f}x'.format(name, cold_ms, templated_ms, cold_ms / templated_ms))
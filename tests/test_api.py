@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import base64
+import io
+import unittest
+import numpy as np
+from app import create_app
+from app.main import wedgebuilder as wb
+
+
+class APITestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        self.ricker = {'vp_1': 3000, 'rho_1': 2.5, 'vp_2': 2700, 'rho_2': 2.3, 'vp_units': 0, 'wv_type': 0,
+                       'freq': 25, 'wv_len': 0.2, 'wv_dt': 0.001}
+        self.ormsby = dict(self.ricker, wv_type=1, freq=[5, 10, 40, 50], rho_2=2.2)
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def _analysis(self, scenario):
+        entry = wb.cached_wavelet(scenario['wv_len'], scenario['wv_dt'], scenario['wv_type'],
+                                  np.atleast_1d(scenario['freq']).tolist())
+        width, height = wb.get_model_geometry(entry.f_central, scenario['wv_dt'])
+        rock_props = [scenario['vp_1'], scenario['rho_1'], scenario['vp_2'], scenario['rho_2'], scenario['vp_1'],
+                      scenario['rho_1']]
+        return wb.WedgeAnalysis(rock_props, entry.w, scenario['wv_dt'], entry.f_central, width, height)
+
+    def test_wedge_json(self):
+        response = self.client.get('/api/v1/wedge', query_string=dict(self.ricker, arrays='amp,z,wavelet'))
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        analysis = self._analysis(self.ricker)
+        self.assertEqual(body['tuning_thickness'], analysis.tuning_thickness)
+        self.assertEqual(body['onset_thickness'], analysis.onset_thickness)
+        self.assertEqual(body['f_central'], 25)
+        self.assertEqual(body['tuning_thickness_theoretical'], wb.get_theoretical_tuning_thickness(25))
+        self.assertTrue(body['permalink'].startswith('/results/vp_1=3000;rho_1=2.5'))
+        self.assertEqual(sorted(body['arrays']), ['amp', 'wavelet', 'z'])
+        np.testing.assert_allclose(body['arrays']['amp'], analysis.amp)
+        np.testing.assert_array_equal(body['arrays']['z'], analysis.z)
+
+    def test_wedge_npy(self):
+        response = self.client.get('/api/v1/wedge', query_string=dict(self.ricker, arrays='synth', format='npy'))
+        synth = np.load(io.BytesIO(base64.b64decode(response.get_json()['arrays']['synth'])))
+        np.testing.assert_array_equal(synth, self._analysis(self.ricker).synth)
+
+    def test_wedge_npz_negotiated(self):
+        response = self.client.get('/api/v1/wedge', query_string=dict(self.ricker, arrays='spectrum,freqs'),
+                                   headers={'Accept': 'application/octet-stream'})
+        self.assertEqual(response.mimetype, 'application/octet-stream')
+        data = np.load(io.BytesIO(response.data))
+        self.assertEqual(float(data['tuning_thickness']), self._analysis(self.ricker).tuning_thickness)
+        self.assertEqual(data['spectrum'].shape, data['freqs'].shape)
+        self.assertNotIn('permalink', data.files)
+
+    def test_wedge_invalid(self):
+        response = self.client.get('/api/v1/wedge', query_string=dict(self.ricker, rho_2=2.5, vp_2=3000))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('layer_2_impedance', response.get_json()['errors'])
+        query = dict(self.ricker)
+        del query['wv_dt']
+        self.assertEqual(self.client.get('/api/v1/wedge', query_string=query).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/wedge', query_string=dict(self.ricker, arrays='rc')).status_code,
+                         400)
+        self.assertEqual(self.client.get('/api/v1/wedge', query_string=dict(self.ricker, format='csv')).status_code,
+                         400)
+
+    def test_wedge_invalid_field(self):
+        response = self.client.get('/api/v1/wedge', query_string=dict(self.ricker, freq=0))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('frequency', response.get_json()['errors'])
+        # the error names the field that is too precise instead of listing every field
+        response = self.client.get('/api/v1/wedge', query_string=dict(self.ricker, wv_dt=0.0005))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['error'], 'Invalid scenario')
+        self.assertIn('three decimal places', response.get_json()['errors']['wv_dt'][0])
+        for vp_1 in ['9e999999999', '1e400']:
+            response = self.client.get('/api/v1/wedge', query_string=dict(self.ricker, vp_1=vp_1))
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('out of range', response.get_json()['errors']['layer_1_vp'][0])
+
+    def test_batch(self):
+        response = self.client.post('/api/v1/wedge/batch?arrays=amp',
+                                    json={'scenarios': [self.ricker, self.ormsby, dict(self.ricker, freq=8)]})
+        self.assertEqual(response.status_code, 200)
+        scenarios = response.get_json()['scenarios']
+        self.assertEqual(len(scenarios), 3)
+        # every scenario matches the single scenario endpoint, including the wider model of the 8 Hz wavelet
+        for scenario, result in zip([self.ricker, self.ormsby, dict(self.ricker, freq=8)], scenarios):
+            analysis = self._analysis(scenario)
+            self.assertEqual(result['tuning_thickness'], analysis.tuning_thickness)
+            self.assertEqual(result['onset_thickness'], analysis.onset_thickness)
+            np.testing.assert_allclose(result['arrays']['amp'], analysis.amp)
+
+    def test_batch_npz(self):
+        response = self.client.post('/api/v1/wedge/batch?arrays=z_apparent&format=npz',
+                                    json={'scenarios': [self.ricker, self.ormsby]})
+        data = np.load(io.BytesIO(response.data))
+        self.assertEqual(data['tuning_thickness'].shape, (2, ))
+        self.assertIn('z_apparent_1', data.files)
+
+    def test_batch_invalid(self):
+        self.assertEqual(self.client.post('/api/v1/wedge/batch', json=[self.ricker]).status_code, 400)
+        self.assertEqual(self.client.post('/api/v1/wedge/batch', json={'scenarios': []}).status_code, 400)
+        response = self.client.post('/api/v1/wedge/batch', json={'scenarios': [self.ricker, dict(self.ricker,
+                                                                                                  freq=[5, 10])]})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.get_json()['error'].startswith('Scenario 1'))
+        self.app.config['API_BATCH_MAX'] = 1
+        response = self.client.post('/api/v1/wedge/batch', json={'scenarios': [self.ricker, self.ricker]})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
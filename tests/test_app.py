@@ -17,6 +17,7 @@ limitations under the License.
 """
 
 import unittest
+from unittest import mock
 from app import create_app
 from app.main.forms import ContactForm, TuningWedgeForm
 
@@ -246,6 +247,109 @@ class AppTestCase(unittest.TestCase):
         self.assertIsNot(form.validate(), True)  # body should be too short to validate
         self.assertEqual(response.status_code, 200)
 
+    def test_results_page_cached(self):
+        from app import results_cache
+        self.client.post('/index', data=self.soft_ricker_wedge_form.data)
+        response = self.client.get('/results')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        with mock.patch('app.main.views._results_context') as results_context:
+            response_hit = self.client.get('/results')
+            results_context.assert_not_called()  # nothing is recomputed on a repeat visit
+        self.assertEqual(response_hit.headers['X-Cache'], 'HIT')
+        self.assertEqual(response_hit.data, response.data)
+        self.assertEqual(results_cache.info().currsize, 1)
+        # a different scenario is a new entry
+        self.client.post('/index', data=self.soft_ormsby_wedge_form.data)
+        self.assertEqual(self.client.get('/results').headers['X-Cache'], 'MISS')
+        self.assertEqual(results_cache.info().currsize, 2)
+
+    def test_index_page_post_redirects_to_permalink(self):
+        response = self.client.post('/index', data=self.soft_ricker_wedge_form.data)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.location.endswith(
+            '/results/vp_1=3000;rho_1=2.5;vp_2=2700;rho_2=2.3;vp_units=0;wv_type=0;freq=25;wv_len=0.2;wv_dt=0.001'
+        ))
+
+    def test_results_permalink(self):
+        url = '/results/vp_1=3000;rho_1=2.5;vp_2=2700;rho_2=2.3;vp_units=0;wv_type=0;freq=25;wv_len=0.2;wv_dt=0.001'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cache_control.max_age, self.app.config['RESULTS_MAX_AGE'])
+        self.assertTrue(response.cache_control.public)
+        self.assertNotIn('Set-Cookie', response.headers)  # the page does not depend on the session
+        etag, weak = response.get_etag()
+        self.assertFalse(weak)
+        # a client holding the page revalidates without the scenario being rendered again
+        with mock.patch('app.main.views._render_results') as render_results:
+            response_304 = self.client.get(url, headers={'If-None-Match': response.headers['ETag']})
+            render_results.assert_not_called()
+        self.assertEqual(response_304.status_code, 304)
+        self.assertEqual(response_304.get_etag(), (etag, False))
+        # a new release changes the validator
+        with mock.patch('app.main.views.__version__', '0.0.0'):
+            response_new = self.client.get(url, headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response_new.status_code, 200)
+        self.assertNotEqual(response_new.get_etag()[0], etag)
+        # so does a bokeh upgrade, as the page points at the BokehJS of the installed version
+        with mock.patch('app.main.views._BOKEH_VERSION', '0.0.0'):
+            response_bokeh = self.client.get(url, headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response_bokeh.status_code, 200)
+        self.assertNotEqual(response_bokeh.get_etag()[0], etag)
+
+    def test_results_permalink_canonical_redirect(self):
+        response = self.client.get(
+            '/results/rho_1=2.50;vp_1=3000;vp_2=2700;rho_2=2.3;vp_units=0;wv_type=0;freq=25;wv_len=0.2;wv_dt=0.001'
+        )
+        self.assertEqual(response.status_code, 301)
+        self.assertTrue(response.location.endswith(
+            '/results/vp_1=3000;rho_1=2.5;vp_2=2700;rho_2=2.3;vp_units=0;wv_type=0;freq=25;wv_len=0.2;wv_dt=0.001'
+        ))
+
+    def test_results_permalink_invalid(self):
+        self.assertEqual(self.client.get('/results/garbage').status_code, 404)
+        # same impedance in both layers does not validate
+        response = self.client.get(
+            '/results/vp_1=3000;rho_1=2.5;vp_2=3000;rho_2=2.5;vp_units=0;wv_type=0;freq=25;wv_len=0.2;wv_dt=0.001'
+        )
+        self.assertEqual(response.status_code, 404)
+        # a Ricker wavelet takes one frequency
+        response = self.client.get(
+            '/results/vp_1=3000;rho_1=2.5;vp_2=2700;rho_2=2.3;vp_units=0;wv_type=0;freq=5,10;wv_len=0.2;wv_dt=0.001'
+        )
+        self.assertEqual(response.status_code, 404)
+        # an exponent too large for the decimal context
+        response = self.client.get(
+            '/results/vp_1=9e999999999;rho_1=2.5;vp_2=2700;rho_2=2.3;vp_units=0;wv_type=0;freq=25;wv_len=0.2;'
+            'wv_dt=0.001'
+        )
+        self.assertEqual(response.status_code, 404)
+        # a zero frequency wavelet has no model to size
+        response = self.client.get(
+            '/results/vp_1=3000;rho_1=2.5;vp_2=2700;rho_2=2.3;vp_units=0;wv_type=0;freq=0;wv_len=0.2;wv_dt=0.001'
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_results_plots(self):
+        url = '/results/vp_1=3000;rho_1=2.5;vp_2=2700;rho_2=2.3;vp_units=0;wv_type=0;freq=25;wv_len=0.2;wv_dt=0.001'
+        page = self.client.get(url)
+        for name in ['wavelet', 'spectrum', 'phase', 'synth', 'earth', 'tuning_curve']:
+            self.assertIn('data-plot-url="{}/plots/{}"'.format(url, name).encode(), page.data)
+            response = self.client.get('{}/plots/{}'.format(url, name))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, 'application/json')
+            self.assertIn('doc', response.get_json())
+            self.assertTrue(response.cache_control.public)
+            # every plot has its own validator
+            self.assertNotEqual(response.get_etag(), page.get_etag())
+            response_304 = self.client.get('{}/plots/{}'.format(url, name),
+                                           headers={'If-None-Match': response.headers['ETag']})
+            self.assertEqual(response_304.status_code, 304)
+        self.assertEqual(self.client.get(url + '/plots/seismogram').status_code, 404)
+        response = self.client.get(url.replace('rho_1=2.5', 'rho_1=2.50') + '/plots/wavelet')
+        self.assertEqual(response.status_code, 301)
+        self.assertTrue(response.location.endswith(url + '/plots/wavelet'))
+
     def test_success_page_get(self):
         response = self.client.get('/success')
         self.assertEqual(response.status_code, 200)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import gzip
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import bokeh
+from bokeh.util.paths import bokehjsdir
+from app import assets, create_app
+from app.assets import VENDOR, integrity
+
+PERMALINK = '/results/vp_1=3000;rho_1=2.5;vp_2=2700;rho_2=2.3;vp_units=0;wv_type=0;freq=25;wv_len=0.2;wv_dt=0.001'
+
+
+class AssetsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        # a static folder holding a stand-in for every vendored library
+        self.static = tempfile.mkdtemp()
+        self.app.static_folder = self.static
+        assets.mode = 'local'
+        for name in VENDOR:
+            self._vendor(name, '/* {} */'.format(name).encode('ascii'))
+        with open(os.path.join(bokehjsdir(), 'js', 'bokeh.min.js'), 'rb') as f:
+            self.bokeh = f.read()
+
+    def tearDown(self):
+        assets.mode = self.app.config['ASSETS_MODE']
+        shutil.rmtree(self.static)
+        self.app_context.pop()
+
+    def _vendor(self, name, data):
+        path = os.path.join(self.static, VENDOR[name].path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        assets.clear()
+
+    def test_local_bokeh(self):
+        page = self.client.get(PERMALINK).get_data(as_text=True)
+        match = re.search(r'<script type="text/javascript" src="(/assets/bokeh-{}\.min\.[0-9a-f]{{16}}\.js)" '
+                          r'integrity="([^"]+)" crossorigin="anonymous">'.format(re.escape(bokeh.__version__)), page)
+        self.assertIsNotNone(match)
+        self.assertEqual(match.group(2), integrity(self.bokeh))
+        self.assertNotIn('cdn.bokeh.org', page)
+        response = self.client.get(match.group(1))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, self.bokeh)
+        self.assertTrue(response.cache_control.immutable)
+        self.assertEqual(response.cache_control.max_age, 365 * 24 * 3600)
+        self.assertEqual(self.client.get(match.group(1), headers={'If-None-Match': response.headers['ETag']})
+                         .status_code, 304)
+        self.assertEqual(self.client.get('/assets/bokeh-0.0.0.min.0123456789abcdef.js').status_code, 404)
+
+    def test_local_bokeh_compressed_once(self):
+        page = self.client.get(PERMALINK).get_data(as_text=True)
+        url = re.search(r'src="(/assets/bokeh-[^"]+)"', page).group(1)
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.vary)
+        self.assertEqual(gzip.decompress(response.data), self.bokeh)
+        # the compressed body is reused, not compressed again by every request
+        with mock.patch('app.compress.gzip.compress') as compress:
+            again = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        compress.assert_not_called()
+        self.assertEqual(again.data, response.data)
+        self.assertNotEqual(again.headers['ETag'], self.client.get(url).headers['ETag'])
+
+    def test_local_vendor(self):
+        page = self.client.get('/').get_data(as_text=True)
+        self.assertNotIn(VENDOR['jquery'].cdn, page)
+        url = re.search(r'src="(/assets/jquery-3\.5\.1\.slim\.min\.[0-9a-f]{16}\.js)"', page).group(1)
+        self.assertIn('integrity="{}"'.format(integrity(b'/* jquery */')), page)
+        self.assertEqual(self.client.get(url).data, b'/* jquery */')
+        self._vendor('bootstrap_css', b'body {}')
+        page = self.client.get('/').get_data(as_text=True)
+        self.assertRegex(page, r'<link rel="stylesheet" type="text/css" href="/assets/bootstrap-4\.5\.2\.min\.'
+                               r'[0-9a-f]{16}\.css"')
+
+    def test_local_vendor_missing(self):
+        # a library that has not been fetched fails the page instead of falling back to its CDN
+        os.remove(os.path.join(self.static, VENDOR['popper'].path))
+        assets.clear()
+        with self.assertRaises(FileNotFoundError):
+            self.client.get('/')
+
+    def test_local_vendor_precompressed_sibling(self):
+        data = b'/* bootstrap */' * 100
+        self._vendor('bootstrap', data)
+        path = os.path.join(self.static, VENDOR['bootstrap'].path)
+        precompressed = gzip.compress(data, compresslevel=9)
+        with open(path + '.gz', 'wb') as f:
+            f.write(precompressed)
+        page = self.client.get('/').get_data(as_text=True)
+        url = re.search(r'src="(/assets/bootstrap-[^"]+)"', page).group(1)
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.data, precompressed)
+
+    def test_cdn(self):
+        assets.mode = 'cdn'
+        page = self.client.get(PERMALINK).get_data(as_text=True)
+        self.assertIn('https://cdn.bokeh.org/bokeh/release/bokeh-{}.min.js'.format(bokeh.__version__), page)
+        self.assertNotIn('/assets/', page)
+
+    def test_inline(self):
+        assets.mode = 'inline'
+        self._vendor('bootstrap_css', b'body { margin: 0; }')
+        page = self.client.get(PERMALINK).get_data(as_text=True)
+        self.assertIn('<style>body { margin: 0; }</style>', page)
+        self.assertIn(self.bokeh.decode('utf-8')[:200], page)
+        self.assertNotIn('/assets/', page)
+
+    def test_default_config_pages(self):
+        # the default config works without the vendored libraries, which are not checked in
+        app = create_app('default')
+        client = app.test_client()
+        for url in ['/', '/about', PERMALINK]:
+            self.assertEqual(client.get(url).status_code, 200, msg=url)
+
+    def test_local_checks_vendored_libraries_at_startup(self):
+        self.app.config['ASSETS_MODE'] = 'local'
+        os.remove(os.path.join(self.static, VENDOR['popper'].path))
+        with self.assertLogs(self.app.logger, 'ERROR') as logs:
+            assets.init_app(self.app)
+        self.assertIn('popper', logs.output[0])
+        # the pages do not look for the missing file again
+        with mock.patch('app.assets.os.path.isfile', wraps=os.path.isfile) as isfile:
+            with self.assertRaises(FileNotFoundError):
+                self.client.get('/')
+        self.assertNotIn(mock.call(os.path.join(self.static, VENDOR['popper'].path)), isfile.call_args_list)
+
+    def test_invalid_mode(self):
+        self.app.config['ASSETS_MODE'] = 'remote'
+        with self.assertRaises(ValueError):
+            assets.init_app(self.app)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -46,3 +46,11 @@ class BokehAmplitudeSpectrumTestCase(unittest.TestCase):
         spectrum, phase = bas.plot_amplitude_spectrum(wb_wavelet, self.dt)
         self.assertIsInstance(type(spectrum), type(figure.__class__))
         self.assertIsInstance(type(phase), type(figure.__class__))
+
+    def test_plot_amplitude_spectrum_cached_wavelet(self):
+        entry = wb.cached_wavelet(self.duration, self.dt, w_type=0, f=[30])
+        spectrum, phase = bas.plot_amplitude_spectrum(entry.w, self.dt, entry.spectrum, entry.freqs)
+        self.assertIsInstance(type(spectrum), type(figure.__class__))
+        self.assertIsInstance(type(phase), type(figure.__class__))
+        # the cached spectrum is read-only and left untouched
+        np.testing.assert_array_equal(entry.spectrum, np.fft.rfft(entry.w))
@@ -18,6 +18,7 @@ import unittest
 from app.main import wedgebuilder as wb
 from app.main import bokeh_plot_wedge as bpw
 import numpy as np
+from bokeh.models import HoverTool
 from bokeh.plotting import figure
 
 
@@ -73,3 +74,105 @@ class BokehPlotWedgeTestCase(unittest.TestCase):
         self.assertIsInstance(onset_meas, int)
         synth_plot = bpw.plot_synth(synth, self.dt, tuning_meas, onset_meas)
         self.assertIsInstance(type(synth_plot), type(figure.__class__))
+
+    def test_plot_with_analysis_axes(self):
+        analysis = wb.WedgeAnalysis(self.rock_props, self.wavelet, self.dt, self.f_central)
+        imp_plot = bpw.plot_earth_model(analysis.imp, self.dt, t=analysis.t_earth, wt=analysis.wt)
+        self.assertIsInstance(type(imp_plot), type(figure.__class__))
+        synth_plot = bpw.plot_synth(
+            analysis.synth, self.dt, analysis.tuning_thickness, analysis.onset_thickness, t=analysis.t, wt=analysis.wt
+        )
+        self.assertIsInstance(type(synth_plot), type(figure.__class__))
+
+    def test_earth_model_x_range_follows_wedge(self):
+        # a widened model keeps the whole wedge on screen in both plots
+        width, height = wb.get_model_geometry(5, self.dt)
+        _, imp = wb.earth_model(self.rock_props, width, height)
+        imp_plot = bpw.plot_earth_model(imp, self.dt)
+        self.assertAlmostEqual(imp_plot.x_range.end, (width - 1) * self.dt * 1000)
+        self.assertAlmostEqual(bpw.plot_earth_model(self.imp, self.dt).x_range.end, 100)
+
+    def test_plot_synth_wiggles_single_glyph(self):
+        synth_plot = bpw.plot_synth(self.synth, self.dt, self.tuning_meas, self.onset_meas)
+        glyphs = [type(renderer.glyph).__name__ for renderer in synth_plot.renderers]
+        # one multi_line for every wiggle, the tuning and onset traces and the image
+        self.assertEqual(glyphs, ['MultiLine', 'Line', 'Line', 'Image'])
+        self.assertNotIn('Patches', glyphs)
+
+    def test_wiggles_match_per_trace_lines(self):
+        synth = np.flipud(self.synth)
+        t = bpw._axis(synth.shape[0], self.dt)
+        wt = bpw._axis(synth.shape[1], self.dt)
+        dx = 2
+        wiggles = bpw._wiggles(synth, t, wt, dx, fill=True)
+        self.assertNotIn('fill_xs', bpw._wiggles(synth, t, wt, dx))
+        self.assertEqual(len(wiggles['xs']), len(synth.T[::dx]))
+        synth_diff = synth.max() - synth.min()
+        for i, trace in enumerate(synth.T[::dx]):
+            x = wt[i * dx] + (((trace - synth.min()) / synth_diff) - 0.5) * 4 * dx
+            np.testing.assert_allclose(wiggles['xs'][i], x)
+            np.testing.assert_array_equal(wiggles['ys'][i], np.flipud(t))
+            self.assertEqual(len(wiggles['fill_xs'][i]), len(wiggles['fill_ys'][i]))
+
+    def test_plot_synth_fill(self):
+        synth_plot = bpw.plot_synth(self.synth, self.dt, self.tuning_meas, self.onset_meas, fill=True)
+        renderers = {type(renderer.glyph).__name__: renderer for renderer in synth_plot.renderers}
+        self.assertIn('Patches', renderers)
+        self.assertIs(renderers['Patches'].data_source, renderers['MultiLine'].data_source)
+
+    def test_image_encodings(self):
+        dtypes = {'float64': np.float64, 'float32': np.float32, 'uint8': np.uint8, 'rgba': np.uint32}
+        for encoding, dtype in dtypes.items():
+            synth_plot = bpw.plot_synth(self.synth, self.dt, self.tuning_meas, self.onset_meas, encoding=encoding)
+            images = [renderer for renderer in synth_plot.renderers if 'Image' in type(renderer.glyph).__name__]
+            self.assertEqual(images[0].data_source.data['image'][0].dtype, dtype)
+            hover = synth_plot.select_one(HoverTool)
+            if encoding.startswith('float'):
+                self.assertEqual(len(images), 1)
+                self.assertEqual(hover.renderers, [images[0]])
+            else:
+                # exact values on hover from a hidden, lower resolution image
+                lookup = hover.renderers[0]
+                self.assertIs(lookup, images[1])
+                self.assertEqual(lookup.glyph.global_alpha, 0)
+                np.testing.assert_allclose(lookup.data_source.data['image'][0],
+                                           np.flipud(self.synth)[::bpw.LOOKUP_STEP, ::bpw.LOOKUP_STEP], rtol=1e-6)
+        imp_plot = bpw.plot_earth_model(self.imp, self.dt, encoding='uint8')
+        self.assertEqual(imp_plot.renderers[0].data_source.data['image'][0].dtype, np.uint8)
+
+    def test_quantized_image_keeps_colours(self):
+        def palette_index(values, low, high, n):
+            # the linear colour mapping of LinearColorMapper
+            index = np.floor((values - low) / (high - low) * n)
+            index[values == high] = n - 1
+            return index
+        expected = palette_index(self.synth, self.synth.min(), self.synth.max(), 11)
+        for levels in [11, 22, 253]:
+            levels_index = bpw._quantize(self.synth, levels).astype(np.float64)
+            np.testing.assert_array_equal(palette_index(levels_index, 0, levels, 11), expected)
+        rgba = bpw._rgba(['#ff0000', '#0080ff'])
+        np.testing.assert_array_equal(rgba, [0xff0000ff, 0xffff8000])
+
+    def test_image_encoding_errors(self):
+        with self.assertRaises(ValueError):
+            bpw.plot_earth_model(self.imp, self.dt, encoding='png')
+        with self.assertRaises(ValueError):
+            bpw.plot_earth_model(self.imp, self.dt, encoding='uint8', levels=300)
+
+    def test_plot_synth_downsampled(self):
+        wavelet = wb.wavelet(self.duration, 0.0005, w_type=0, f=self.f)
+        analysis = wb.WedgeAnalysis(self.rock_props, wavelet, 0.0005, self.f_central)
+        self.assertGreater(analysis.synth.shape[0], 300)
+        args = (analysis.synth, 0.0005, analysis.tuning_thickness, analysis.onset_thickness)
+        synth_plot = bpw.plot_synth(*args, t=analysis.t, wt=analysis.wt, fill=True)
+        sources = {type(renderer.glyph).__name__: renderer.data_source for renderer in synth_plot.renderers}
+        # every wiggle is cut to the plot height, its polygon follows
+        self.assertEqual({len(xs) for xs in sources['MultiLine'].data['xs']}, {synth_plot.plot_height})
+        self.assertEqual({len(xs) for xs in sources['Patches'].data['fill_xs']}, {2 * synth_plot.plot_height})
+        traces = sources['Line'].data
+        self.assertLessEqual(len(traces['t']), 2 * synth_plot.plot_height)
+        full = bpw.plot_synth(*args, t=analysis.t, wt=analysis.wt, max_points=0)
+        full_traces = [renderer.data_source for renderer in full.renderers if type(renderer.glyph).__name__ == 'Line']
+        self.assertEqual(len(full_traces[0].data['t']), analysis.synth.shape[0])
+        np.testing.assert_allclose(np.max(traces['tuning']), np.max(full_traces[0].data['tuning']))
+        np.testing.assert_allclose(np.min(traces['tuning']), np.min(full_traces[0].data['tuning']))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import unittest
+
+import numpy as np
+from bokeh.embed import json_item
+from bokeh.plotting import figure
+
+from app.main import bokeh_sources as bs
+from app.main import bokeh_plot_wedge as bpw
+from app.main import bokeh_tuning_curve as btc
+from app.main import wedgebuilder as wb
+
+
+class BokehSourcesTestCase(unittest.TestCase):
+
+    def test_column_types(self):
+        self.assertEqual(bs.column(np.linspace(0, 1, 5)).dtype, np.float32)
+        self.assertEqual(bs.column([0.5, 1.5]).dtype, np.float32)
+        self.assertEqual(bs.column(np.arange(5)).dtype, np.int32)
+        self.assertEqual(bs.column([True, False]).dtype, np.int32)
+        # slices of other arrays become contiguous
+        values = np.arange(20.0).reshape(4, 5)[:, ::2]
+        converted = bs.column(values)
+        self.assertTrue(converted.flags['C_CONTIGUOUS'])
+        np.testing.assert_array_equal(converted, values)
+
+    def test_column_errors(self):
+        with self.assertRaises(ValueError):
+            bs.column(np.fft.rfft(np.ones(8)))
+        with self.assertRaises(ValueError):
+            bs.column(np.array([2 ** 40]))
+
+    def test_data_source(self):
+        t = np.arange(10.0)
+        rows = [np.arange(10.0) + i for i in range(3)]
+        source = bs.data_source(x=t, xs=rows, ys=[t] * 3)
+        self.assertEqual(source.data['x'].dtype, np.float32)
+        self.assertEqual([row.dtype for row in source.data['xs']], [np.float32] * 3)
+        # the repeated axis is converted once and shared
+        self.assertIs(source.data['ys'][0], source.data['ys'][2])
+        self.assertIs(source.data['ys'][0], source.data['x'])
+
+    def test_plots_send_binary_columns(self):
+        rock_props = [3000, 2.5, 2700, 2.3, 3000, 2.5]
+        analysis = wb.WedgeAnalysis(rock_props, wb.wavelet(0.2, 0.001, w_type=0, f=[25]), 0.001, 25.0)
+        plots = [
+            bpw.plot_synth(analysis.synth, 0.001, analysis.tuning_thickness, analysis.onset_thickness,
+                           t=analysis.t, wt=analysis.wt, encoding='uint8'),
+            btc.plot_tuning_curve(analysis.z, analysis.amp, analysis.z_apparent, analysis.tuning_thickness,
+                                  analysis.onset_thickness),
+        ]
+        for plot in plots:
+            item = json.dumps(json_item(plot))
+            for reference in json.loads(item)['doc']['roots']['references']:
+                if reference['type'] != 'ColumnDataSource':
+                    continue
+                for name, value in reference['attributes']['data'].items():
+                    for array in (value if isinstance(value, list) else [value]):
+                        self.assertIn('__ndarray__', array, name)
+                        self.assertIn(array['dtype'], ['float32', 'int32', 'uint8', 'uint32'], name)
+
+    def test_plot_size(self):
+        plot = figure()
+        plot.line('x', 'y', source=bs.data_source(x=np.arange(100.0), y=np.zeros(100)))
+        item = json.dumps(json_item(plot))
+        size = bs.plot_size(item)
+        self.assertEqual(size.bytes, len(item))
+        self.assertLess(size.gzip_bytes, size.bytes)
+        self.assertEqual([column.column for column in size.columns], ['x', 'y'])
+        self.assertEqual(size.data_bytes, sum(column.bytes for column in size.columns))
+
+    def test_lttb_short_series(self):
+        x = np.arange(10.0)
+        np.testing.assert_array_equal(bs.lttb(x, np.sin(x), 20), np.arange(10))
+        np.testing.assert_array_equal(bs.lttb(x, np.vstack([x, x]), 10), np.tile(np.arange(10), (2, 1)))
+
+    def test_lttb(self):
+        x = np.arange(2000.0)
+        y = np.sin(x / 50) + np.random.RandomState(0).normal(0, 0.1, x.size)
+        indices = bs.lttb(x, y, 300, keep=[1000])
+        self.assertEqual(indices.shape, (300,))
+        self.assertEqual((indices[0], indices[-1]), (0, x.size - 1))
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        for index in [np.argmax(y), np.argmin(y), 1000]:
+            self.assertIn(index, indices)
+        # the kept samples follow the shape of the series
+        self.assertLess(np.max(np.abs(np.interp(x, x[indices], y[indices]) - np.sin(x / 50))), 0.6)
+
+    def test_lttb_rows(self):
+        x = np.linspace(0, 10, 500)
+        rows = np.vstack([np.sin(x), np.cos(3 * x), x ** 2])
+        indices = bs.lttb(x, rows, 50)
+        self.assertEqual(indices.shape, (3, 50))
+        self.assertTrue(np.all(np.diff(indices, axis=1) > 0))
+        for row, row_indices in zip(rows, indices):
+            self.assertIn(np.argmax(row), row_indices)
+            self.assertIn(np.argmin(row), row_indices)
+            np.testing.assert_array_equal(row_indices, bs.lttb(x, row, 50))
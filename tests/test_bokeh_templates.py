@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import unittest
+
+from bokeh.core.json_encoder import serialize_json
+from bokeh.embed import json_item
+from bokeh.models import Line, Range1d
+from bokeh.plotting import figure
+
+from app.main import bokeh_amplitude_spectrum as bas
+from app.main import bokeh_plot_wedge as bpw
+from app.main import bokeh_templates as bt
+from app.main import bokeh_tuning_curve as btc
+from app.main import bokeh_wavelet as bwv
+from app.main import wedgebuilder as wb
+
+
+def _normalized(item):
+    """The models of a json_item with their ids replaced by their types, which differ between builds"""
+    item = json.loads(item) if isinstance(item, str) else json.loads(serialize_json(item))
+    references = item['doc']['roots']['references']
+    types = {reference['id']: reference['type'] for reference in references}
+
+    def strip(value):
+        if isinstance(value, dict):
+            if set(value) == {'id'}:
+                return {'id': types.get(value['id'])}
+            return {key: strip(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [strip(item) for item in value]
+        return value
+    return sorted(json.dumps([reference['type'], strip(reference['attributes'])], sort_keys=True)
+                  for reference in references)
+
+
+class FigureTemplateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.builds = 0
+
+    def _build(self):
+        self.builds += 1
+        plot = figure(x_range=Range1d(0, 1, name='x_range'))
+        plot.line('x', 'y', source=bt.named_source('line', 'x', 'y'))
+        return plot
+
+    def test_skeleton_built_once(self):
+        template = bt.FigureTemplate(self._build)
+        first = template.item({'line': {'data': {'x': [0, 1], 'y': [1, 2]}}, 'x_range': {'end': 5}})
+        second = template.item({'line': {'data': {'x': [0, 1, 2], 'y': [1, 2, 3]}}, 'x_range': {'end': 7}})
+        self.assertEqual(self.builds, 1)
+        references = {reference['type']: reference['attributes']
+                      for reference in json.loads(second)['doc']['roots']['references']}
+        self.assertEqual(references['ColumnDataSource']['data'], {'x': [0, 1, 2], 'y': [1, 2, 3]})
+        self.assertEqual(references['Range1d']['end'], 7)
+        # the skeleton is left untouched
+        self.assertIn('"end": 5', first)
+
+    def test_figure_matches_item(self):
+        template = bt.FigureTemplate(self._build)
+        values = {'line': {'data': {'x': [0, 1], 'y': [1, 2]}}, 'x_range': {'end': 5}}
+        plot = template.figure(values)
+        self.assertEqual(plot.x_range.end, 5)
+        self.assertEqual(_normalized(json_item(plot)), _normalized(template.item(values)))
+
+    def test_template_registry(self):
+        self.assertIs(bt.template(bpw._earth_model_figure, 'uint8'), bt.template(bpw._earth_model_figure, 'uint8'))
+        self.assertIsNot(bt.template(bpw._earth_model_figure, 'uint8'),
+                         bt.template(bpw._earth_model_figure, 'rgba'))
+
+
+class PlotTemplatesTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dt = 0.001
+        cls.entry = wb.cached_wavelet(0.2, cls.dt, 0, [25])
+        cls.analysis = wb.WedgeAnalysis([3000, 2.5, 2700, 2.3, 3000, 2.5], cls.entry.w, cls.dt, cls.entry.f_central)
+
+    def assertSamePlot(self, plot, item):
+        self.assertEqual(_normalized(json_item(plot)), _normalized(item))
+
+    def test_wavelet(self):
+        self.assertSamePlot(bwv.plot_wavelet(self.entry.w, 0.2), bwv.wavelet_item(self.entry.w, 0.2))
+
+    def test_amplitude_spectrum(self):
+        plots = bas.plot_amplitude_spectrum(self.entry.w, self.dt, self.entry.spectrum, self.entry.freqs)
+        items = bas.amplitude_spectrum_items(self.entry.w, self.dt, self.entry.spectrum, self.entry.freqs)
+        self.assertEqual(len(items), 2)
+        for plot, item in zip(plots, items):
+            self.assertSamePlot(plot, item)
+
+    def test_tuning_curve(self):
+        a = self.analysis
+        args = (a.z, a.amp, a.z_apparent, a.tuning_thickness, a.onset_thickness)
+        self.assertSamePlot(btc.plot_tuning_curve(*args), btc.tuning_curve_item(*args))
+
+    def test_earth_model(self):
+        for encoding in bpw.ENCODINGS:
+            kwargs = dict(t=self.analysis.t_earth, wt=self.analysis.wt, encoding=encoding)
+            self.assertSamePlot(bpw.plot_earth_model(self.analysis.imp, self.dt, **kwargs),
+                                bpw.earth_model_item(self.analysis.imp, self.dt, **kwargs))
+
+    def test_synth(self):
+        a = self.analysis
+        args = (a.synth, self.dt, a.tuning_thickness, a.onset_thickness)
+        for encoding in bpw.ENCODINGS:
+            for fill in [False, True]:
+                kwargs = dict(t=a.t, wt=a.wt, fill=fill, encoding=encoding)
+                self.assertSamePlot(bpw.plot_synth(*args, **kwargs), bpw.synth_item(*args, **kwargs))
+        # no onset trace when the onset thickness is off the model
+        args = (a.synth, self.dt, a.tuning_thickness, 10 ** 6)
+        plot = bpw.plot_synth(*args, t=a.t, wt=a.wt)
+        self.assertEqual([type(renderer.glyph) for renderer in plot.renderers].count(Line), 1)
+        self.assertSamePlot(plot, bpw.synth_item(*args, t=a.t, wt=a.wt))
@@ -61,3 +61,30 @@ class BokehTuningCurveTestCase(unittest.TestCase):
             self.onset_meas
         )
         self.assertIsInstance(type(tuning_curve), type(figure.__class__))
+
+    def test_plot_tuning_curve_low_frequency(self):
+        # a widened model puts the onset of tuning past 100 ms, the thickness axes still cover it
+        for f_central in [5, 8, 10]:
+            wvlt = wb.wavelet(self.duration, self.dt, w_type=0, f=[f_central])
+            z, amp, z_apparent, tuning, onset = wb.tuning_metrics(
+                self.rock_props, wvlt, self.dt, f_central, *wb.get_model_geometry(f_central, self.dt)
+            )
+            tuning_curve = btc.plot_tuning_curve(z, amp, z_apparent, tuning, onset)
+            self.assertGreater(onset, 100)
+            self.assertGreaterEqual(tuning_curve.x_range.end, onset)
+            self.assertEqual(tuning_curve.x_range.end, z[-1])
+            self.assertEqual(tuning_curve.extra_y_ranges['thickness'].end, z[-1])
+        default = btc.plot_tuning_curve(self.true_wedge_thickness, self.amplitude, self.apparent_wedge_thickness,
+                                        self.tuning_meas, self.onset_meas)
+        self.assertEqual((default.x_range.end, default.extra_y_ranges['thickness'].end), (100, 100))
+
+    def test_plot_tuning_curve_downsampled(self):
+        z, amp, z_apparent = self.true_wedge_thickness, self.amplitude, self.apparent_wedge_thickness
+        full = btc.plot_tuning_curve(z, amp, z_apparent, self.tuning_meas, self.onset_meas)
+        self.assertEqual(len(full.renderers[0].data_source.data['x']), len(z))
+        tuning_curve = btc.plot_tuning_curve(z, amp, z_apparent, self.tuning_meas, self.onset_meas, max_points=20)
+        data = tuning_curve.renderers[0].data_source.data
+        self.assertLessEqual(len(data['x']), 40)
+        np.testing.assert_allclose(np.max(data['y']), np.max(amp), rtol=1e-6)
+        for thickness in [self.tuning_meas, self.onset_meas]:
+            self.assertIn(z[np.argmin(np.abs(z - thickness))], data['x'])
@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+import numpy as np
+from app.cache import ResultsCache, SingleFlight, WedgeStore, fcntl, fingerprint
+
+
+class ResultsCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResultsCache(maxsize=2, ttl=60)
+
+    def test_fingerprint_is_canonical(self):
+        self.assertEqual(fingerprint({'a': 1, 'b': [5, 10]}), fingerprint({'b': [5, 10], 'a': 1}))
+        self.assertNotEqual(fingerprint({'a': 1}), fingerprint({'a': 2}))
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.set('a', 1)
+        self.assertEqual(self.cache.get('a'), 1)
+        info = self.cache.info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 1, 1))
+        self.assertEqual(self.cache.hit_rate, 0.5)
+        self.assertEqual(self.cache.peek('a'), 1)
+        self.assertIsNone(self.cache.peek('b'))
+        self.assertEqual(self.cache.info()[:2], (1, 1))  # peek is not counted
+
+    def test_lru_eviction(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')  # b is now the least recently used entry
+        self.cache.set('c', 3)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.get('c'), 3)
+        self.assertEqual(self.cache.info().currsize, 2)
+
+    def test_ttl_expiry(self):
+        with mock.patch('app.cache.time.monotonic', return_value=100.):
+            self.cache.set('a', 1)
+        with mock.patch('app.cache.time.monotonic', return_value=159.):
+            self.assertEqual(self.cache.get('a'), 1)
+        with mock.patch('app.cache.time.monotonic', return_value=161.):
+            self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.info().currsize, 0)
+
+    def test_disabled(self):
+        cache = ResultsCache(maxsize=0)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+    def test_clear(self):
+        self.cache.set('a', 1)
+        self.cache.get('a')
+        self.cache.clear()
+        self.assertEqual(self.cache.info()[:4], (0, 0, 2, 0))
+
+
+class WedgeStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = WedgeStore(self.directory, max_bytes=10 * 1024)
+        self.params = {'scenario': 1}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_save_load(self):
+        self.assertIsNone(self.store.load(self.params, 'synth'))
+        synth = np.arange(12.).reshape(3, 4)
+        self.store.save(self.params, 'synth', synth)
+        loaded = self.store.load(self.params, 'synth')
+        self.assertIsInstance(loaded, np.memmap)
+        np.testing.assert_array_equal(loaded, synth)
+        with self.assertRaises(ValueError):
+            loaded[0, 0] = 1
+        self.store.save(self.params, 'tuning_thickness', 17.0)
+        self.assertEqual(self.store.load(self.params, 'tuning_thickness').item(), 17.0)
+        self.assertIsNone(self.store.load({'scenario': 2}, 'synth'))
+        info = self.store.info()
+        self.assertEqual((info.hits, info.misses, info.entries), (2, 2, 1))
+        # nothing is left behind by the atomic writes
+        for root, _, files in os.walk(self.directory):
+            self.assertFalse([f for f in files if f.endswith('.tmp')])
+
+    def test_eviction(self):
+        for i in range(4):
+            self.store.save({'scenario': i}, 'synth', np.zeros(512))  # 4 KiB each
+            os.utime(self.store._entry({'scenario': i}), (i, i))
+        # the two least recently used scenarios were evicted to stay below 10 KiB
+        self.assertIsNone(self.store.load({'scenario': 0}, 'synth'))
+        self.assertIsNone(self.store.load({'scenario': 1}, 'synth'))
+        self.assertIsNotNone(self.store.load({'scenario': 3}, 'synth'))
+        self.assertLessEqual(self.store.info().nbytes, 10 * 1024)
+
+    def test_eviction_scans_only_over_budget(self):
+        with mock.patch.object(self.store, '_entries', wraps=self.store._entries) as entries:
+            # the first save scans the store once, later saves keep a running total until it is full
+            for name in ['a', 'b', 'c', 'd']:
+                self.store.save(self.params, name, np.zeros(256))  # 2 KiB each
+            self.assertEqual(entries.call_count, 1)
+            self.store.save({'scenario': 2}, 'synth', np.zeros(512))
+            self.assertEqual(entries.call_count, 2)
+        self.assertLessEqual(self.store.info().nbytes, 0.9 * 10 * 1024)
+
+    def test_disabled(self):
+        store = WedgeStore()
+        self.assertFalse(store.enabled)
+        store.save(self.params, 'synth', np.zeros(3))
+        self.assertIsNone(store.load(self.params, 'synth'))
+
+
+class SingleFlightTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight()
+
+    def wait_for_calls(self, n):
+        for _ in range(1000):
+            if self.flight.info().calls >= n:
+                return
+            time.sleep(0.001)
+
+    def test_concurrent_calls_coalesce(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def compute():
+            started.set()
+            release.wait()
+            return object()
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.flight.do('key', compute)))
+                   for _ in range(5)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        self.wait_for_calls(5)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(result) for result, _ in results}), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True, True])
+        self.assertEqual(self.flight.info(), (5, 1, 4, 0))
+        # once finished, the next call computes again
+        self.flight.do('key', compute)
+        self.assertEqual(self.flight.info().executions, 2)
+
+    def test_errors_are_shared(self):
+        release = threading.Event()
+
+        def compute():
+            release.wait()
+            raise RuntimeError('failed')
+
+        errors = []
+
+        def call():
+            try:
+                self.flight.do('key', compute)
+            except RuntimeError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        self.wait_for_calls(2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 2)
+
+    def test_lookup(self):
+        result, shared = self.flight.do('key', lambda: 1, lookup=lambda: 2)
+        self.assertEqual((result, shared), (2, True))
+        self.assertEqual(self.flight.info().executions, 0)
+
+    @unittest.skipIf(fcntl is None, 'fcntl is not available')
+    def test_lock_file_across_processes(self):
+        lock_dir = tempfile.mkdtemp()
+        try:
+            # two instances lock separately opened files, just like two processes do
+            holder, waiter = SingleFlight(lock_dir), SingleFlight(lock_dir)
+            started = threading.Event()
+            release = threading.Event()
+
+            def compute():
+                started.set()
+                release.wait()
+                return {'synth': [1, 2]}
+
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(('holder', holder.do('key', compute)))),
+                       threading.Thread(target=lambda: results.append(('waiter', waiter.do('key', lambda: None))))]
+            threads[0].start()
+            started.wait()
+            threads[1].start()
+            for _ in range(1000):
+                if waiter.info().waited:
+                    break
+                time.sleep(0.001)
+            release.set()
+            for thread in threads:
+                thread.join()
+            # the waiter reads the result the holder left in the lock file instead of computing it again
+            self.assertEqual(sorted(results), [('holder', ({'synth': [1, 2]}, False)),
+                                               ('waiter', ({'synth': [1, 2]}, True))])
+            self.assertEqual(waiter.info(), (1, 0, 1, 1))
+            # and the lock file is gone once the computation is over
+            self.assertEqual(os.listdir(lock_dir), [])
+        finally:
+            shutil.rmtree(lock_dir, ignore_errors=True)
+
+    @unittest.skipIf(fcntl is None, 'fcntl is not available')
+    def test_lock_file_hands_over_stored_analysis(self):
+        from app.main import wedgebuilder as wb
+        lock_dir, store_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+        try:
+            # both a wedge store and a lock directory, as configured for several workers
+            holder, waiter = SingleFlight(lock_dir), SingleFlight(lock_dir)
+            rock_props = [3000, 2.5, 2700, 2.3, 3000, 2.5]
+            wvlt = wb.wavelet(0.2, 0.001, w_type=0, f=[25])
+            started = threading.Event()
+            release = threading.Event()
+
+            def compute():
+                started.set()
+                release.wait()
+                analysis = wb.WedgeAnalysis(rock_props, wvlt, 0.001, 25, store=WedgeStore(store_dir))
+                analysis.tuning_thickness
+                return analysis
+
+            results = {}
+            threads = [threading.Thread(target=lambda: results.update(holder=holder.do('key', compute))),
+                       threading.Thread(target=lambda: results.update(waiter=waiter.do('key', compute)))]
+            threads[0].start()
+            started.wait()
+            threads[1].start()
+            for _ in range(1000):
+                if waiter.info().waited:
+                    break
+                time.sleep(0.001)
+            with self.assertNoLogs('app.cache'):
+                release.set()
+                for thread in threads:
+                    thread.join()
+            analysis, shared = results['waiter']
+            self.assertTrue(shared)
+            self.assertIsNone(analysis.store)
+            self.assertEqual(analysis.tuning_thickness, results['holder'][0].tuning_thickness)
+            np.testing.assert_array_equal(analysis.synth, results['holder'][0].synth)
+        finally:
+            shutil.rmtree(lock_dir, ignore_errors=True)
+            shutil.rmtree(store_dir, ignore_errors=True)
+
+    @unittest.skipIf(fcntl is None, 'fcntl is not available')
+    def test_lock_file_unpicklable_result(self):
+        lock_dir = tempfile.mkdtemp()
+        try:
+            holder, waiter = SingleFlight(lock_dir), SingleFlight(lock_dir)
+            started = threading.Event()
+            release = threading.Event()
+
+            def compute():
+                started.set()
+                release.wait()
+                return threading.Lock()
+
+            results = []
+            thread = threading.Thread(target=lambda: holder.do('key', compute))
+            thread.start()
+            started.wait()
+            other = threading.Thread(target=lambda: results.append(waiter.do('key', lambda: 3)))
+            other.start()
+            for _ in range(1000):
+                if waiter.info().waited:
+                    break
+                time.sleep(0.001)
+            with self.assertLogs('app.cache', 'ERROR'):
+                release.set()
+                thread.join()
+            other.join()
+            # the failure is logged and the waiter computes the result itself
+            self.assertEqual(results, [(3, False)])
+        finally:
+            shutil.rmtree(lock_dir, ignore_errors=True)
+
+    @unittest.skipIf(fcntl is None, 'fcntl is not available')
+    def test_lock_file_failed_holder(self):
+        lock_dir = tempfile.mkdtemp()
+        try:
+            holder, waiter = SingleFlight(lock_dir), SingleFlight(lock_dir)
+            started = threading.Event()
+            release = threading.Event()
+
+            def fail():
+                started.set()
+                release.wait()
+                raise RuntimeError('failed')
+
+            errors = []
+            results = []
+
+            def call():
+                try:
+                    holder.do('key', fail)
+                except RuntimeError as e:
+                    errors.append(e)
+
+            thread = threading.Thread(target=call)
+            thread.start()
+            started.wait()
+            other = threading.Thread(target=lambda: results.append(waiter.do('key', lambda: 3)))
+            other.start()
+            for _ in range(1000):
+                if waiter.info().waited:
+                    break
+                time.sleep(0.001)
+            release.set()
+            thread.join()
+            other.join()
+            # nothing was handed over, so the waiter computes the result itself
+            self.assertEqual(len(errors), 1)
+            self.assertEqual(results, [(3, False)])
+            self.assertEqual(os.listdir(lock_dir), [])
+        finally:
+            shutil.rmtree(lock_dir, ignore_errors=True)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from app import compress, create_app
+from app.compress import brotli
+
+PERMALINK = '/results/vp_1=3000;rho_1=2.5;vp_2=2700;rho_2=2.3;vp_units=0;wv_type=0;freq=25;wv_len=0.2;wv_dt=0.001'
+
+
+class CompressTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        self.static = tempfile.mkdtemp()
+        self.app.static_folder = self.static
+        with open(os.path.join(self.static, 'script.js'), 'w') as f:
+            f.write('// results\n' * 200)
+
+    def tearDown(self):
+        shutil.rmtree(self.static)
+        self.app_context.pop()
+
+    def test_gzip_response(self):
+        plain = self.client.get(PERMALINK + '/plots/synth')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+        response = self.client.get(PERMALINK + '/plots/synth', headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        self.assertLess(len(response.data), len(plain.data) / 2)
+        # the compressed bytes carry the weak etag, which still revalidates
+        etag, weak = response.get_etag()
+        self.assertTrue(weak)
+        self.assertEqual(etag, plain.get_etag()[0])
+        response_304 = self.client.get(PERMALINK + '/plots/synth', headers={'Accept-Encoding': 'gzip',
+                                                                             'If-None-Match': 'W/"{}"'.format(etag)})
+        self.assertEqual(response_304.status_code, 304)
+        info = compress.info()['main.plot']
+        self.assertEqual(info.responses, 1)
+        self.assertEqual(info.original_bytes, len(plain.data))
+        self.assertEqual(info.saved, len(plain.data) - len(response.data))
+
+    def test_not_compressed(self):
+        # below the size threshold
+        self.app.config['COMPRESS_MIN_SIZE'] = compress.min_size = 10 ** 9
+        response = self.client.get(PERMALINK, headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        compress.min_size = 500
+        # the client does not accept any coding
+        response = self.client.get(PERMALINK, headers={'Accept-Encoding': 'identity'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(compress.info(), {})
+
+    @unittest.skipIf(brotli is None, 'brotli is not installed')
+    def test_brotli_response(self):
+        plain = self.client.get(PERMALINK + '/plots/earth')
+        response = self.client.get(PERMALINK + '/plots/earth', headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.data), plain.data)
+
+    def test_precompressed_static(self):
+        written = compress.precompress_static(self.app)
+        self.assertIn((os.path.join(self.static, 'script.js'), 'gzip', 2200), [w[:3] for w in written])
+        # siblings that are up to date are not written again
+        self.assertEqual(compress.precompress_static(self.app), [])
+        plain = self.client.get('/static/script.js')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        response = self.client.get('/static/script.js', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn(response.mimetype, ['application/javascript', 'text/javascript'])
+        self.assertEqual(gzip.decompress(response.get_data()), plain.get_data())
+        plain.close()
+        response.close()
+        self.assertEqual(compress.info()['static'].original_bytes, 2200)
+
+    def test_precompressed_static_moved_into_place(self):
+        path = os.path.join(self.static, 'script.js')
+        with mock.patch('app.compress.os.replace', wraps=os.replace) as replace:
+            compress.precompress_static(self.app)
+        # every sibling appears under its final name only once it has been written in full
+        self.assertIn(path + '.gz', [call.args[1] for call in replace.call_args_list])
+        for call in replace.call_args_list:
+            self.assertEqual(os.path.dirname(call.args[0]), self.static)
+        self.assertEqual([name for name in os.listdir(self.static) if name.endswith('.tmp')], [])
+        with open(path, 'rb') as f, gzip.open(path + '.gz') as g:
+            self.assertEqual(g.read(), f.read())
+
+    def test_precompressed_static_failed_write(self):
+        with mock.patch('app.compress.os.replace', side_effect=OSError):
+            with self.assertRaises(OSError):
+                compress.precompress_static(self.app)
+        self.assertEqual(os.listdir(self.static), ['script.js'])
+
+    def test_stale_static_sibling_is_ignored(self):
+        path = os.path.join(self.static, 'script.js')
+        compress.precompress_static(self.app)
+        os.utime(path + '.gz', (0, 0))
+        response = self.client.get('/static/script.js', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        response.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import unittest
+from app.importtime import DEFERRED_PACKAGES, by_package, measure_import_time, parse_import_time
+
+REPORT = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:      1773 |       2000 |     flask.app
+import time:       227 |       2227 |   flask
+import time:        50 |       2500 | app
+"""
+
+
+class ImportTimeTestCase(unittest.TestCase):
+
+    def test_parse(self):
+        times = parse_import_time('Traceback-free noise\n' + REPORT)
+        self.assertEqual([t.module for t in times], ['_io', 'flask.app', 'flask', 'app'])
+        self.assertEqual(times[1].self_us, 1773)
+        self.assertEqual(times[3].cumulative_us, 2500)
+
+    def test_by_package(self):
+        self.assertEqual(by_package(parse_import_time(REPORT)), [('flask', 2000), ('_io', 120), ('app', 50)])
+
+    def test_create_app_defers_heavy_imports(self):
+        modules = set(t.module.split('.')[0] for t in measure_import_time('testing'))
+        self.assertIn('flask', modules)
+        self.assertIn('app', modules)
+        for package in DEFERRED_PACKAGES:
+            self.assertNotIn(package, modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import unittest
+from app.main.permalink import FieldError, decode_params, encode_params
+
+
+class PermalinkTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.params = {'vp_1': 3000000, 'rho_1': 2500, 'vp_2': 2700000, 'rho_2': 2300, 'vp_3': 3000000,
+                       'rho_3': 2500, 'vp_units': 0, 'wv_type': 1, 'wv_len': 200, 'wv_dt': 1,
+                       'freq': [5, 10, 40, 50]}
+        self.text = 'vp_1=3000;rho_1=2.5;vp_2=2700;rho_2=2.3;vp_units=0;wv_type=1;freq=5,10,40,50;wv_len=0.2;wv_dt=0.001'
+
+    def test_encode(self):
+        self.assertEqual(encode_params(self.params), self.text)
+
+    def test_decode(self):
+        self.assertEqual(decode_params(self.text), self.params)
+
+    def test_decode_any_order_and_notation(self):
+        text = 'wv_dt=0.0010;rho_1=2.500;vp_1=3000.0;vp_2=2700;rho_2=2.3;vp_units=0;wv_type=1;freq=5,10,40,50;wv_len=.2'
+        self.assertEqual(decode_params(text), self.params)
+        self.assertEqual(encode_params(decode_params(text)), self.text)
+
+    def test_decode_invalid(self):
+        for text in ['', 'garbage', self.text + ';extra=1', self.text.replace(';wv_dt=0.001', ''),
+                     self.text.replace('vp_1=3000', 'vp_1=abc'), self.text.replace('rho_1=2.5', 'rho_1=2.5001'),
+                     self.text.replace('rho_1=2.5', 'rho_1=-2.5'), self.text.replace('freq=5,10,40,50', 'freq=5,x'),
+                     self.text.replace('vp_1=3000', 'vp_1=inf'), self.text + ';vp_1=3000',
+                     self.text.replace('vp_1=3000', 'vp_1=9e999999999'), self.text.replace('vp_1=3000', 'vp_1=1e400'),
+                     self.text.replace('rho_1=2.5', 'rho_1=1e-999999999')]:
+            with self.assertRaises(ValueError, msg=text):
+                decode_params(text)
+
+    def test_decode_field_error(self):
+        with self.assertRaises(FieldError) as cm:
+            decode_params(self.text.replace('wv_dt=0.001', 'wv_dt=0.0005'))
+        self.assertEqual(cm.exception.field, 'wv_dt')
+        with self.assertRaises(FieldError) as cm:
+            decode_params(self.text.replace('freq=5,10,40,50', 'freq=5,x'))
+        self.assertEqual(cm.exception.field, 'frequency')
+
+
+if __name__ == '__main__':
+    unittest.main()
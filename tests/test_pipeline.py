@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2020, Benjamin L. Dowdell
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import threading
+import time
+import unittest
+from app import create_app, results_pipeline
+from app.cache import SingleFlight
+from app.main.views import _results_context
+from app.pipeline import Pipeline
+
+
+class PipelineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.pipeline = Pipeline(maxsize=4)
+
+        @self.pipeline.stage('total', inputs=['a', 'b'], by_value=True)
+        def total(a, b):
+            self.calls.append('total')
+            return a + b
+
+        @self.pipeline.stage('double', deps=['total'])
+        def double(total):
+            self.calls.append('double')
+            return 2 * total
+
+        @self.pipeline.stage('label', inputs=['name'], deps=['double'])
+        def label(name, double):
+            self.calls.append('label')
+            return '{}={}'.format(name, double)
+
+    def test_run(self):
+        self.assertEqual(self.pipeline.run({'a': 1, 'b': 2, 'name': 'x'}),
+                         {'total': 3, 'double': 6, 'label': 'x=6'})
+        self.assertEqual(self.calls, ['total', 'double', 'label'])
+
+    def test_targets_evaluate_only_upstream_stages(self):
+        self.assertEqual(self.pipeline.run({'a': 1, 'b': 2}, ['double']), {'total': 3, 'double': 6})
+        self.assertEqual(self.calls, ['total', 'double'])
+
+    def test_unchanged_stages_are_reused(self):
+        self.pipeline.run({'a': 1, 'b': 2, 'name': 'x'})
+        self.pipeline.run({'a': 1, 'b': 2, 'name': 'y'})
+        self.assertEqual(self.calls, ['total', 'double', 'label', 'label'])
+        info = self.pipeline.info()
+        self.assertEqual((info['total'].hits, info['total'].misses), (1, 1))
+        self.assertEqual((info['label'].hits, info['label'].misses), (0, 2))
+
+    def test_by_value_stage_keeps_dependents(self):
+        # different inputs with the same total reuse every downstream stage
+        self.pipeline.run({'a': 1, 'b': 2, 'name': 'x'})
+        self.assertEqual(self.pipeline.run({'a': 2, 'b': 1, 'name': 'x'})['label'], 'x=6')
+        self.assertEqual(self.calls, ['total', 'double', 'label', 'total'])
+
+    def test_unknown_dependency(self):
+        with self.assertRaises(ValueError):
+            self.pipeline.stage('bad', deps=['missing'])
+
+    def test_flight_coalesces_identical_stages(self):
+        flight = SingleFlight()
+        pipeline = Pipeline(maxsize=4, flight=flight)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        @pipeline.stage('slow', inputs=['a'])
+        def slow(a):
+            calls.append(a)
+            started.set()
+            release.wait(5)
+            return a
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(pipeline.run({'a': 1})['slow'])) for _ in range(3)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        while flight.info().calls < 3:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, [1, 1, 1])
+
+    def test_disabled(self):
+        pipeline = Pipeline(maxsize=0)
+        calls = []
+
+        @pipeline.stage('value', inputs=['a'])
+        def value(a):
+            calls.append(a)
+            return a
+
+        pipeline.run({'a': 1})
+        pipeline.run({'a': 1})
+        self.assertEqual(calls, [1, 1])
+
+
+class ResultsPipelineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.params = {'vp_1': 3000000, 'rho_1': 2500, 'vp_2': 2700000, 'rho_2': 2300, 'vp_3': 3000000,
+                       'rho_3': 2500, 'vp_units': 0, 'wv_type': 0, 'wv_len': 100, 'wv_dt': 1, 'freq': [30]}
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def _hits(self, params):
+        results_pipeline.run(self.params)
+        before = results_pipeline.info()
+        results_pipeline.run(params)
+        after = results_pipeline.info()
+        return {name for name in after if after[name].hits > before[name].hits}
+
+    def test_frequency_change_reuses_earth_model(self):
+        # geometry is evaluated again for the new wavelet, but its unchanged value keeps the earth model
+        hits = self._hits(dict(self.params, freq=[35]))
+        self.assertTrue({'rock_props', 'earth', 'earth_plot'} <= hits)
+        self.assertFalse({'wavelet', 'analysis', 'synth_plot', 'tuning_curve_plot'} & hits)
+
+    def test_density_change_reuses_wavelet(self):
+        hits = self._hits(dict(self.params, rho_2=2200))
+        self.assertTrue({'wavelet', 'geometry', 'wavelet_plot', 'spectrum_plots'} <= hits)
+        self.assertFalse({'rock_props', 'earth', 'earth_plot', 'analysis', 'synth_plot'} & hits)
+
+    def test_context(self):
+        with self.app.test_request_context():
+            context = _results_context(self.params)
+        self.assertEqual(sorted(context['plot_urls']), ['earth', 'phase', 'spectrum', 'synth', 'tuning_curve',
+                                                        'wavelet'])
+        self.assertEqual(context['freq'], [30])
+        self.assertAlmostEqual(context['wv_dt'], 0.001)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,7 +14,11 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import shutil
+import tempfile
 import unittest
+from unittest import mock
+from app.cache import WedgeStore
 from app.main import wedgebuilder as wb
 import numpy as np
 
@@ -68,6 +72,70 @@ class WedgeBuilderTestCase(unittest.TestCase):
         with self.assertRaises(TypeError):
             _, _ = wb.earth_model(['3000', '2.5', '2700', '2.3', '3000', '2.5'])
 
+    def test_earth_model_geometry(self):
+        wb_rc, wb_imp = wb.earth_model(self.rock_props, width=51, height=400, max_thickness=200, top=100)
+        self.assertEqual(wb_rc.shape, (400, 51))
+        self.assertEqual(wb_imp.shape, (400, 51))
+        thickness = wb.wedge_thickness_samples(51, 200)
+        self.assertEqual(thickness[0], 0)
+        self.assertEqual(thickness[-1], 200)
+        # the top of the wedge is at sample 100 and the base is max_thickness samples below it in the last trace
+        self.assertEqual(wb_imp[99, -1], self.layer_1_impedance)
+        self.assertEqual(wb_imp[100, -1], self.layer_2_impedance)
+        self.assertEqual(wb_imp[300, -1], self.layer_3_impedance)
+        self.assertNotEqual(wb_rc[100, -1], 0)
+        self.assertNotEqual(wb_rc[300, -1], 0)
+        self.assertEqual(np.count_nonzero(wb_rc[:, -1]), 2)
+
+    def test_get_model_geometry(self):
+        self.assertEqual(wb.get_model_geometry(30, 0.001), (101, 240))
+        width, height = wb.get_model_geometry(5, 0.001)
+        self.assertGreater(width, 101)
+        self.assertGreater(height, height // 3 + width)
+        # a wider model measures the tuning onset instead of falling back to the theoretical value
+        wvlt = wb.wavelet(self.duration, self.dt, w_type=0, f=[8])
+        wb_rc, _ = wb.earth_model(self.rock_props, *wb.get_model_geometry(8, self.dt))
+        wb_synth = wb.tuning_wedge(wb_rc, wvlt)
+        dz_true = wb.get_wedge_thickness(wb_synth, self.dt)
+        dz_apparent = wb.get_apparent_wedge_thickness(wb_synth, self.dt, self.acoustic_impedance)
+        onset = wb.get_measured_onset_tuning_thickness(dz_true, dz_apparent, 8)
+        self.assertNotEqual(onset, wb.get_theoretical_onset_tuning_thickness(8))
+
+    def test_get_model_geometry_bounds(self):
+        self.assertEqual(wb.get_model_geometry(1, 0.001), wb.get_model_geometry(3, 0.001))
+        width, height = wb.get_model_geometry(1, 0.001)
+        self.assertEqual(width, wb._MAX_MODEL_WIDTH)
+        self.assertLess(height, 1000)
+        for f_central, dt in [(0, 0.001), (-5, 0.001), (30, 0)]:
+            with self.assertRaises(ValueError):
+                wb.get_model_geometry(f_central, dt)
+
+    def test_sparse_earth_model(self):
+        wb_rc, _ = wb.earth_model(self.rock_props)
+        positions, amplitudes = wb.sparse_earth_model(self.rock_props)
+        self.assertEqual(positions.shape, (2, 101))
+        self.assertEqual(amplitudes.shape, (2, 101))
+        # scattering the spikes back into a dense grid reproduces the dense reflectivity
+        dense = np.zeros((240, 101))
+        for k in range(2):
+            np.add.at(dense, (positions[k], np.arange(101)), amplitudes[k])
+        np.testing.assert_array_equal(dense, wb_rc)
+        with self.assertRaises(ValueError):
+            wb.sparse_earth_model(5)
+
+    def test_sparse_earth_model_base_below_model(self):
+        positions, amplitudes = wb.sparse_earth_model(self.rock_props, width=301, height=240)
+        self.assertEqual(positions.shape, (2, 301))
+        self.assertTrue(np.all(amplitudes[1, positions[1] >= 240] == 0))
+
+    def test_sparse_earth_model_top_at_first_sample(self):
+        wb_rc, _ = wb.earth_model(self.rock_props, top=0)
+        positions, amplitudes = wb.sparse_earth_model(self.rock_props, top=0)
+        np.testing.assert_array_equal(wb_rc[0], amplitudes[0])
+        wvlt = wb.wavelet(self.duration, self.dt, w_type=0, f=[30])
+        np.testing.assert_allclose(wb.sparse_tuning_wedge(positions, amplitudes, wvlt), wb.tuning_wedge(wb_rc, wvlt),
+                                   atol=1e-12)
+
     def test_wavelet_ricker(self):
         wb_wavelet = wb.wavelet(self.duration, self.dt, w_type=0, f=[30])
         self.assertIsInstance(wb_wavelet, np.ndarray)
@@ -161,6 +229,40 @@ class WedgeBuilderTestCase(unittest.TestCase):
         self.assertEqual(wb_synth.shape[0], int(0.500 / self.dt))
         self.assertEqual(wb_synth.shape[1], wb_rc.shape[1])
 
+    def test_tuning_wedge_matches_column_convolution(self):
+        wb_rc, _ = wb.earth_model(self.rock_props)
+        # short wavelets take the matrix product, long wavelets take the FFT path
+        for duration in [0.010, 0.200, 0.500, 1.000]:
+            wvlt = wb.wavelet(duration, self.dt, w_type=0, f=[30])
+            expected = np.apply_along_axis(lambda t: np.convolve(t, wvlt, mode="same"), axis=0, arr=wb_rc)
+            wb_synth = wb.tuning_wedge(wb_rc, wvlt)
+            self.assertEqual(wb_synth.shape, expected.shape)
+            np.testing.assert_allclose(wb_synth, expected, atol=1e-12)
+
+    def test_tuning_wedge_fft_path(self):
+        wb_rc, _ = wb.earth_model(self.rock_props, 51, 1000)
+        wvlt = wb.wavelet(1.000, self.dt, w_type=0, f=[30])
+        self.assertFalse(wb._use_matrix_convolution(1000, wvlt.size))
+        self.assertTrue(wb._use_matrix_convolution(240, 201))
+        expected = np.apply_along_axis(lambda t: np.convolve(t, wvlt, mode="same"), axis=0, arr=wb_rc)
+        np.testing.assert_allclose(wb.tuning_wedge(wb_rc, wvlt), expected, atol=1e-12)
+
+    def test_convolve_same_single_trace(self):
+        trace = np.random.default_rng(0).normal(size=50)
+        for m in [3, 8, 49, 50, 51, 120]:
+            wvlt = np.hanning(m)
+            np.testing.assert_allclose(wb.convolve_same(trace, wvlt), np.convolve(trace, wvlt, mode="same"), atol=1e-12)
+
+    def test_sparse_tuning_wedge(self):
+        rock_props = [2700, 2.3, 3000, 2.5, 3200, 2.6]
+        wb_rc, _ = wb.earth_model(rock_props)
+        positions, amplitudes = wb.sparse_earth_model(rock_props)
+        for duration in [0.010, 0.200, 0.500]:
+            wvlt = wb.wavelet(duration, self.dt, w_type=1, f=[5, 10, 40, 50])
+            wb_synth = wb.sparse_tuning_wedge(positions, amplitudes, wvlt, height=240)
+            self.assertEqual(wb_synth.shape, (max(240, len(wvlt)), 101))
+            np.testing.assert_allclose(wb_synth, wb.tuning_wedge(wb_rc, wvlt), atol=1e-12)
+
     def test_get_wedge_thickness(self):
         wb_rc, wb_imp = wb.earth_model(self.rock_props)
         wb_wavelet = wb.wavelet(self.duration, self.dt, w_type=0, f=[30])
@@ -260,3 +362,209 @@ class WedgeBuilderTestCase(unittest.TestCase):
         self.assertIsInstance(tuning_curve_amp, np.ndarray)
         self.assertEqual(tuning_curve_amp.shape, (101, ))
         self.assertGreaterEqual(np.min(tuning_curve_amp), 0)
+
+    def test_tuning_metrics_matches_section(self):
+        scenarios = [
+            (self.rock_props, 0, [30], 0.200, 0.001),
+            (self.rock_props, 1, [5, 10, 40, 50], 0.200, 0.002),
+            ([2700, 2.3, 3000, 2.5, 2700, 2.3], 0, [25], 0.100, 0.001),
+            ([2700, 2.3, 3000, 2.5, 3400, 2.6], 0, [10], 0.500, 0.004),
+            ([3000, 2.5, 2700, 2.3, 3000, 2.5], 0, [30], 1.000, 0.001),
+            # side lobes that tie exactly, which rounding noise used to decide differently in the two paths
+            ([2700, 2.3, 3000, 2.5, 3400, 2.6], 0, [53], 0.200, 0.002),
+            ([3880, 2.29, 2935, 2.42, 2410, 2.76], 0, [5], 0.100, 0.001),
+            ([2134, 2.2, 2159, 2.14, 2386, 2.58], 0, [86], 0.500, 0.001),
+        ]
+        for rock_props, w_type, f, duration, dt in scenarios:
+            acoustic_impedance = wb.impedance_model(rock_props)
+            f_central = wb.get_central_frequency(w_type, f)
+            wvlt = wb.wavelet(duration, dt, w_type=w_type, f=f)
+            rc, _ = wb.earth_model(rock_props)
+            synth = wb.tuning_wedge(rc, wvlt)
+            z = wb.get_wedge_thickness(synth, dt)
+            z_apparent = wb.get_apparent_wedge_thickness(synth, dt, acoustic_impedance)
+
+            wb_z, wb_amp, wb_z_apparent, wb_tuning, wb_onset = wb.tuning_metrics(rock_props, wvlt, dt, f_central)
+            np.testing.assert_array_equal(wb_z, z)
+            np.testing.assert_allclose(wb_amp, wb.get_tuning_curve_amplitude(acoustic_impedance, synth), atol=1e-12)
+            np.testing.assert_array_equal(wb_z_apparent, z_apparent)
+            # the base is never picked above the top
+            self.assertTrue(np.all(z_apparent >= 0))
+            self.assertEqual(wb_tuning, wb.get_measured_tuning_thickness(synth, dt, acoustic_impedance))
+            self.assertEqual(wb_onset, wb.get_measured_onset_tuning_thickness(z, z_apparent, f_central))
+            self.assertIsInstance(wb_onset, int)
+
+    def test_cached_tuning_wedge(self):
+        wvlt = wb.wavelet(self.duration, self.dt, w_type=0, f=[30])
+        for rock_props in [self.rock_props, [2700, 2.3, 3000, 2.5, 3400, 2.6]]:
+            rc, _ = wb.earth_model(rock_props)
+            np.testing.assert_allclose(wb.cached_tuning_wedge(rock_props, wvlt), wb.tuning_wedge(rc, wvlt), atol=1e-12)
+        # changing only the rock properties reuses the cached unit synthetics
+        hits = wb.unit_synthetic_cache_info().hits
+        synth = wb.cached_tuning_wedge([3200, 2.6, 2500, 2.2, 3200, 2.6], wvlt)
+        self.assertEqual(wb.unit_synthetic_cache_info().hits, hits + 1)
+        self.assertTrue(synth.flags.writeable)
+        with self.assertRaises(ValueError):
+            wb.cached_tuning_wedge(5, wvlt)
+
+    def test_wedge_analysis(self):
+        for rock_props in [self.rock_props, [2700, 2.3, 3000, 2.5, 2700, 2.3]]:
+            acoustic_impedance = wb.impedance_model(rock_props)
+            wvlt = wb.wavelet(self.duration, self.dt, w_type=0, f=[30])
+            analysis = wb.WedgeAnalysis(rock_props, wvlt, self.dt, 30)
+            rc, imp = wb.earth_model(rock_props)
+            synth = wb.tuning_wedge(rc, wvlt)
+            np.testing.assert_array_equal(analysis.rc, rc)
+            np.testing.assert_array_equal(analysis.imp, imp)
+            np.testing.assert_allclose(analysis.synth, synth, atol=1e-12)
+            self.assertEqual(analysis.t.shape, (synth.shape[0], ))
+            self.assertEqual(analysis.t_earth.shape, (240, ))
+            np.testing.assert_array_equal(analysis.z, wb.get_wedge_thickness(synth, self.dt))
+            np.testing.assert_allclose(analysis.amp, wb.get_tuning_curve_amplitude(acoustic_impedance, synth))
+            z_apparent = wb.get_apparent_wedge_thickness(synth, self.dt, acoustic_impedance)
+            np.testing.assert_array_equal(analysis.z_apparent, z_apparent)
+            self.assertEqual(
+                analysis.tuning_thickness,
+                wb.get_measured_tuning_thickness(synth, self.dt, acoustic_impedance)
+            )
+            self.assertEqual(
+                analysis.onset_thickness,
+                wb.get_measured_onset_tuning_thickness(analysis.z, z_apparent, 30)
+            )
+
+    def test_wedge_analysis_is_computed_once(self):
+        wvlt = wb.wavelet(self.duration, self.dt, w_type=0, f=[30])
+        analysis = wb.WedgeAnalysis(self.rock_props, wvlt, self.dt, 30)
+        self.assertIs(analysis.synth, analysis.synth)
+        self.assertIs(analysis.wt, analysis.wt)
+        self.assertIs(analysis.amp, analysis.amp)
+        self.assertIn('synth', vars(analysis))
+        self.assertNotIn('rc', vars(analysis))  # nothing is computed until it is asked for
+
+    def test_wedge_analysis_float32(self):
+        for f in [10, 30, 60]:
+            wvlt = wb.wavelet(self.duration, self.dt, w_type=0, f=[f])
+            self.assertEqual(wb.wavelet(self.duration, self.dt, w_type=0, f=[f], dtype=np.float32).dtype, np.float32)
+            reference = wb.WedgeAnalysis(self.rock_props, wvlt, self.dt, f)
+            analysis = wb.WedgeAnalysis(self.rock_props, wvlt, self.dt, f, dtype=np.float32)
+            self.assertEqual(analysis.imp.dtype, np.float32)
+            self.assertEqual(analysis.synth.dtype, np.float32)
+            np.testing.assert_allclose(analysis.synth, reference.synth, atol=1e-6)
+            # measurements agree to within one sample
+            self.assertLessEqual(abs(analysis.tuning_thickness - reference.tuning_thickness), self.dt * 1000)
+            self.assertLessEqual(abs(analysis.onset_thickness - reference.onset_thickness), self.dt * 1000)
+
+    def test_tuning_sweep_matches_wedge_analysis(self):
+        rock_props = [
+            self.rock_props,
+            [2700, 2.3, 3000, 2.5, 2700, 2.3],
+            [2700, 2.3, 3000, 2.5, 3400, 2.6],
+        ]
+        wavelets = [(0, [30], 0.200, 0.001), (0, [60], 0.100, 0.001), (1, [5, 10, 40, 50], 0.200, 0.002)]
+        scenarios = [(r, ) + wv for wv in wavelets for r in rock_props]
+        sweep = wb.tuning_sweep(
+            [s[0] for s in scenarios], [s[1] for s in scenarios], [s[2] for s in scenarios],
+            [s[3] for s in scenarios], [s[4] for s in scenarios], width=101, height=240
+        )
+        self.assertEqual(sweep.amp.shape, (len(scenarios), 101))
+        for i, (rock, w_type, f, duration, dt) in enumerate(scenarios):
+            f_central = wb.get_central_frequency(w_type, f)
+            analysis = wb.WedgeAnalysis(rock, wb.wavelet(duration, dt, w_type, f), dt, f_central)
+            self.assertEqual(sweep.f_central[i], f_central)
+            np.testing.assert_array_equal(sweep.z[i], analysis.z)
+            np.testing.assert_array_equal(sweep.amp[i], analysis.amp)
+            np.testing.assert_array_equal(sweep.z_apparent[i], analysis.z_apparent)
+            self.assertEqual(sweep.tuning[i], analysis.tuning_thickness)
+            self.assertEqual(sweep.onset[i], analysis.onset_thickness)
+
+    def test_tuning_sweep_broadcasts(self):
+        sweep = wb.tuning_sweep(self.rock_props, 0, [10, 30, 60], dt=[0.001, 0.001, 0.002])
+        # the default geometry fits the lowest frequency scenario
+        width, _ = wb.get_model_geometry(10, 0.001)
+        self.assertEqual(sweep.z.shape, (3, width))
+        np.testing.assert_array_equal(sweep.f_central, [10, 30, 60])
+        with self.assertRaises(ValueError):
+            wb.tuning_sweep(self.rock_props, 0, [10, 30, 60], dt=[0.001, 0.002])
+
+    def test_cached_wavelet(self):
+        entry = wb.cached_wavelet(self.duration, self.dt, 1, [5, 10, 40, 50])
+        np.testing.assert_array_equal(entry.w, wb.wavelet(self.duration, self.dt, 1, [5, 10, 40, 50]))
+        np.testing.assert_array_equal(entry.spectrum, np.fft.rfft(entry.w))
+        np.testing.assert_array_equal(entry.freqs, np.fft.rfftfreq(entry.w.size, d=self.dt))
+        self.assertEqual(entry.f_central, wb.get_central_frequency(1, [5, 10, 40, 50]))
+        for array in entry[:3]:
+            with self.assertRaises(ValueError):
+                array[0] = 1
+        ricker = wb.cached_wavelet(self.duration, self.dt, 0, [25])
+        hits = wb.wavelet_cache_info().hits
+        self.assertIs(wb.cached_wavelet(self.duration, self.dt, 1, (5, 10, 40, 50)), entry)
+        # the default frequencies share the entry of the explicit ones
+        self.assertIs(wb.cached_wavelet(self.duration, self.dt, 0), ricker)
+        self.assertEqual(wb.wavelet_cache_info().hits, hits + 2)
+        self.assertEqual(wb.cached_wavelet(self.duration, self.dt, 0, dtype=np.float32).w.dtype, np.float32)
+
+    def test_subsample_measurements(self):
+        # with sub-sample measurements a coarse dt should reproduce a fine dt within the documented tolerance
+        scenarios = [(self.rock_props, 0, [30]), (self.rock_props, 0, [50]), (self.rock_props, 1, [5, 10, 40, 50]),
+                     ([3000, 2.5, 2500, 2.2, 2800, 2.4], 0, [20])]
+        for rock_props, w_type, f in scenarios:
+            results = []
+            for dt in [0.0005, 0.004]:
+                entry = wb.cached_wavelet(0.100, dt, w_type, f)
+                width, height = wb.get_model_geometry(entry.f_central, dt)
+                results.append(wb.WedgeAnalysis(rock_props, entry.w, dt, entry.f_central, width, height,
+                                                subsample=True))
+            fine, coarse = results
+            self.assertLessEqual(abs(coarse.tuning_thickness - fine.tuning_thickness), 0.5)
+            self.assertLessEqual(abs(coarse.onset_thickness - fine.onset_thickness), 1.5)
+
+    def test_subsample_functions(self):
+        dt = 0.004
+        acoustic_impedance = wb.impedance_model(self.rock_props)
+        entry = wb.cached_wavelet(self.duration, dt, 0, [30])
+        rc, _ = wb.earth_model(self.rock_props)
+        synth = wb.tuning_wedge(rc, entry.w)
+        analysis = wb.WedgeAnalysis(self.rock_props, entry.w, dt, 30, subsample=True)
+        z_apparent = wb.get_apparent_wedge_thickness(synth, dt, acoustic_impedance, subsample=True)
+        np.testing.assert_allclose(z_apparent, analysis.z_apparent)
+        # each sub-sample pick moves by at most half a sample, and the whole-sample thickness is truncated to 1 ms
+        whole = wb.get_apparent_wedge_thickness(synth, dt, acoustic_impedance)
+        self.assertLessEqual(np.max(np.abs(z_apparent - whole)), dt * 1000 * 2)
+        tuning = wb.get_measured_tuning_thickness(synth, dt, acoustic_impedance, subsample=True)
+        self.assertAlmostEqual(tuning, analysis.tuning_thickness)
+        self.assertLessEqual(abs(tuning - wb.get_measured_tuning_thickness(synth, dt, acoustic_impedance)), dt * 500)
+        onset = wb.get_measured_onset_tuning_thickness(analysis.wt, z_apparent, 30, subsample=True)
+        self.assertAlmostEqual(onset, analysis.onset_thickness)
+        self.assertIsInstance(onset, float)
+
+    def test_wedge_analysis_store(self):
+        directory = tempfile.mkdtemp()
+        try:
+            store = WedgeStore(directory)
+            wvlt = wb.wavelet(self.duration, self.dt, w_type=0, f=[30])
+            reference = wb.WedgeAnalysis(self.rock_props, wvlt, self.dt, 30)
+            first = wb.WedgeAnalysis(self.rock_props, wvlt, self.dt, 30, store=store)
+            self.assertEqual(first.tuning_thickness, reference.tuning_thickness)
+            self.assertEqual(first.onset_thickness, reference.onset_thickness)
+            np.testing.assert_array_equal(first.synth, reference.synth)
+            second = wb.WedgeAnalysis(self.rock_props, wvlt, self.dt, 30, store=store)
+            with mock.patch.object(wb, 'cached_tuning_wedge') as synthesis:
+                self.assertIsInstance(second.synth, np.memmap)
+                self.assertEqual(second.onset_thickness, reference.onset_thickness)
+                self.assertEqual(second.tuning_thickness, reference.tuning_thickness)
+                np.testing.assert_array_equal(second.z_apparent, reference.z_apparent)
+                synthesis.assert_not_called()
+            # the sweep reads the measurements stored by the analysis
+            hits = store.info().hits
+            sweep = wb.tuning_sweep(self.rock_props, 0, [[30]], self.duration, self.dt, 101, 240, store=store)
+            self.assertEqual(store.info().hits, hits + 4)
+            self.assertEqual(sweep.tuning[0], reference.tuning_thickness)
+            self.assertEqual(sweep.onset[0], reference.onset_thickness)
+            np.testing.assert_array_equal(sweep.amp[0], reference.amp)
+            # and stores the measurements of the scenarios it computes
+            other = [2700, 2.3, 3000, 2.5, 2700, 2.3]
+            sweep = wb.tuning_sweep(other, 0, [[30]], self.duration, self.dt, 101, 240, store=store)
+            params = wb._scenario_params(other, wvlt, self.dt, 30, 101, 240, None, None, False)
+            self.assertEqual(store.load(params, 'tuning_thickness').item(), sweep.tuning[0])
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)